@@ -11,11 +11,14 @@ import habitica
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
+def autocron(session):
+    log.info("Cronning...")
+    session.cron()
+
 def main():
     log.info("Connecting...")
     session = habitica.session(log=log)
-    log.info("Cronning...")
-    session.cron()
+    autocron(session)
     log.info("Done! :-)")
 
 if __name__ == "__main__":
@@ -1,160 +1,155 @@
 """
 A script for feeding all your pets.
 
-Usage: python autofeed.py
+Usage: python autofeed.py [--dry-run] [--trace] [--profile]
+
+With --dry-run, the planned feedings are listed, but not performed.
 """
 
+import bisect
 import logging
 import math
 import sys
-import time
 
+import catalog
 import habitica
+import tracing
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-food_mapping = {
-    "Meat": "Base",
-    "Milk": "White",
-    "Potatoe": "Desert",
-    "Strawberry": "Red",
-    "Chocolate": "Shade",
-    "Fish": "Skeleton",
-    "RottenMeat": "Zombie",
-    "CottonCandyPink": "CottonCandyPink",
-    "CottonCandyBlue": "CottonCandyBlue",
-    "Honey": "Golden",
-}
-
-base_pets = {
-    'Wolf',
-    'TigerCub',
-    'PandaCub',
-    'LionCub',
-    'Fox',
-    'FlyingPig',
-    'Dragon',
-    'Cactus',
-    'BearCub',
-}
-# These wacky pets do not need feeding.
-wacky_pets = \
-    {f"{p}-Veggie" for p in base_pets} | \
-    {f"{p}-Dessert" for p in base_pets} | \
-    {f"{p}-VirtualPet" for p in base_pets} | \
-    {f"{p}-TeaShop" for p in base_pets} | \
-    {f"{p}-Fungi" for p in base_pets} | \
-    {f"{p}-Cryptid" for p in base_pets}
-
-# These special pets must never be fed.
-special_pets = {
-    'Wolf-Veteran',
-    'Hydra-Base', # Guess
-    'Turkey-Base',
-    'BearCub-Polar',
-    'MantisShrimp-Base',
-    'JackOLantern-Base',
-    'Mammoth-Base',
-    'Tiger-Veteran',
-    'Phoenix-Base',
-    'Turkey-Gilded',
-    'MagicalBee-Base',
-    'Gryphon-RoyalPurple',
-    'JackOLantern-Ghost',
-    'Jackalope-RoyalPurple',
-    'Orca-Base',
-    'Hippogriff-Hopeful',
-    'JackOLantern-Glow',
-    'Gryphatrice-Jubilant',
-}
-do_not_feed = wacky_pets | special_pets
-
-# These types of pets want only a certain kind of food.
-# Whereas quest pets (e.g. "Sunshine") love all foods.
-picky_pet_types = food_mapping.values()
-
-def optimal_pet_type_for_food(food):
-    if food in food_mapping:
-        # E.g.: Fish -> Skeleton
-        return food_mapping[food]
-    if '_' in food:
-        # E.g.: Cake_Base -> Base
-        return food[food.rindex('_')+1:]
-    return None
-
-def autofeed(session, profile):
-    foods = profile['items']['food']
+# The parts of the profile that feeding reads.
+profile_fields = ('items.pets', 'items.mounts', 'items.food')
+
+# The parts that feeding changes, to record in the history afterwards.
+history_fields = ('items.mounts', 'items.food')
+
+def index_hungry_pets(profile, catalog):
+    """
+    Find the pets that should be fed, in a single pass over the stable.
+    Special pets must never be fed, and wacky pets do not need feeding.
+
+    :return: Dictionary of pet type (e.g. 'Base') -> dictionary of
+             hungry pet -> current score, in stable order.
+    """
     pets = profile['items']['pets']
     mounts = profile['items']['mounts']
-
-    def should_feed(pet, needed_pet_type=None):
-        score = pets[pet]
+    do_not_feed = catalog.special_pets | catalog.wacky_pets
+    hungry = {}
+    for pet, score in pets.items():
         if pet in do_not_feed:
             log.debug(f"Skipping wacky/special pet: {pet}")
-            return False
-        if score < 0:
-            log.debug(f"We do not have {pet}")
-            return False
-        if score >= 50:
-            log.debug(f"{pet} is already full")
-            return False
-        if pet in mounts and mounts[pet] is True:
+            continue
+        if score < 0 or score >= 50:
+            # We do not have this pet, or it is already full.
+            continue
+        if mounts.get(pet) is True:
             log.debug(f"We already have {pet} as a mount")
-            return False
+            continue
         dash = pet.find("-")
         if dash < 0:
             log.warning(f"Skipping weird pet: {pet}")
-            return False
-        pet_type = pet[dash+1:]
-        if needed_pet_type is not None and pet_type != needed_pet_type:
-            # This pet is not the type we are looking for.
-            log.debug(f"Pet {pet} is not a {needed_pet_type}")
-            return False
-        return True
-
-    def feed_pet(pet, food):
-        score = pets[pet]
-        hunger = 50 - score
-        ideal_amount = math.ceil(hunger / 5)
-        amount = min(foods[food], ideal_amount)
-        log.info(f"Feeding {food} x{amount} to {pet}...")
-        time.sleep(2.1) # NB: Mitigate rate limit causing 401s.
-        session.feed(pet, food, amount)
-        pets[pet] += 5 * amount
+            continue
+        hungry.setdefault(pet[dash+1:], {})[pet] = score
+    return hungry
+
+def ideal_amount(score):
+    """Amount of food that fills a pet with the given score."""
+    return math.ceil((50 - score) / 5)
+
+def plan_feeding(profile, catalog):
+    """
+    Compute the complete list of feedings to perform, without feeding.
+
+    Picky pets get their favorite food first. Remaining food then goes to
+    the other (quest) pets, which like everything, and finally to any picky
+    pets still hungry. Each pet is fed in as few calls as the food supply
+    allows: normally one call, with enough food to fill it.
+
+    :return: List of (pet, food, amount) tuples.
+    """
+    foods = {food: count for food, count in profile['items']['food'].items() if count > 0}
+    hungry = index_hungry_pets(profile, catalog)
+    plan = []
+
+    def feed(pet, food, pets_of_type):
+        amount = min(foods[food], ideal_amount(pets_of_type[pet]))
+        plan.append((pet, food, amount))
+        pets_of_type[pet] += 5 * amount
+        if pets_of_type[pet] >= 50: del pets_of_type[pet]
         foods[food] -= amount
+        return amount
 
     # Feed picky pets first.
-    for food, count in foods.items():
-        if count == 0: continue
-
-        # Discern needed pet type for this food.
-        needed_pet_type = optimal_pet_type_for_food(food)
-        if needed_pet_type is None:
-            if food != 'Saddle':
-                log.warning(f'Skipping unknown food: {food}')
-            continue
-
-        # Now look for hungry pets of this type.
-        for pet in pets:
-            if should_feed(pet, needed_pet_type):
-                # Found a matching pet! Now let's feed it.
-                feed_pet(pet, food)
+    with tracing.span('picky pass'):
+        for food in list(foods):
+            # Discern needed pet type for this food, e.g. Fish -> Skeleton.
+            needed_pet_type = catalog.pet_type_for_food(food)
+            if needed_pet_type is None:
+                if food != 'Saddle':
+                    log.warning(f'Skipping unknown food: {food}')
+                continue
+
+            # Now feed hungry pets of this type, until the food runs out.
+            pets_of_type = hungry.get(needed_pet_type, {})
+            for pet in list(pets_of_type):
+                feed(pet, food, pets_of_type)
                 if foods[food] == 0: break
 
-    # Now feed any other hungry (but not picky) pets.
-    for pet in pets:
-        while should_feed(pet):
-            # Find the most plentiful food.
-            amount, best_food = max((foods[food], food) for food in foods)
-            if amount == 0: return # We ran out of food!
-            feed_pet(pet, best_food)
+    # Now feed any other hungry pets: quest pets, then leftover picky ones.
+    # Saddles are not food; never waste them here.
+    supply = sorted((count, food) for food, count in foods.items()
+        if count > 0 and food != 'Saddle')
+    # Standard pet types want only a certain kind of food,
+    # whereas quest pets (e.g. "Sunshine") love all foods.
+    types = sorted(hungry, key=lambda pet_type: pet_type in catalog.standard_potions)
+    with tracing.span('other pass'):
+        for pet_type in types:
+            pets_of_type = hungry[pet_type]
+            for pet in list(pets_of_type):
+                while pet in pets_of_type:
+                    if not supply: return plan # We ran out of food!
+                    # Use the smallest supply that fills the pet in one call,
+                    # keeping bigger supplies for later; else the biggest one.
+                    i = bisect.bisect_left(supply, (ideal_amount(pets_of_type[pet]), ''))
+                    count, food = supply.pop(min(i, len(supply) - 1))
+                    count -= feed(pet, food, pets_of_type)
+                    if count > 0: bisect.insort(supply, (count, food))
+    return plan
+
+def autofeed(session, profile, dry_run=False):
+    """
+    Feed all hungry pets, as planned by plan_feeding.
+
+    :param dry_run: If True, only log the planned feedings.
+    """
+    with tracing.span('catalog'):
+        feeding_catalog = catalog.load(session)
+    with tracing.span('plan', hot=True):
+        plan = plan_feeding(profile, feeding_catalog)
+    total = sum(amount for _, _, amount in plan)
+    log.info(f"Planned {len(plan)} feedings, using {total} food.")
+    with tracing.span('act', feedings=len(plan)):
+        for pet, food, amount in plan:
+            if dry_run:
+                log.info(f"Would feed {food} x{amount} to {pet}")
+                continue
+            log.info(f"Feeding {food} x{amount} to {pet}...")
+            session.feed(pet, food, amount)
+    if plan and not dry_run and session.history is not None:
+        # Record the food eaten (and mounts raised) now, rather than
+        # whenever some later download happens to include them.
+        session.profile(history_fields)
 
 def main():
-    session = habitica.session(log=log)
+    tracing.setup()
+    dry_run = '--dry-run' in sys.argv
+    session = tracing.instrument(habitica.session(log=log))
     log.info("Fetching profile...")
-    profile = session.profile('items')
-    autofeed(session, profile)
+    with tracing.span('fetch'):
+        profile = session.profile(profile_fields)
+    autofeed(session, profile, dry_run)
+    log.info(f"Connection reuse: {session.connection_stats()}")
     log.info("Done! :-)")
 
 if __name__ == "__main__":
@@ -0,0 +1,204 @@
+"""
+A resident scheduler daemon: the Python counterpart of autoloop.sh.
+
+Rather than launching a fresh interpreter for every step, it runs each job
+in-process, sharing one warm Habitica session (and its open connections)
+for the whole nightly cycle. It logs the latency of each job as it runs,
+and a per-job summary after each cycle.
+
+Usage: python autoloop.py
+
+The schedule is read from ~/.config/habitica-tools/schedule.json if it
+exists; otherwise the same schedule as autoloop.sh is used. The format is:
+
+    {
+      "slots": [
+        {"at": "23:59", "fire": "force-start", "jobs": [
+          "autosmash", {"job": "autocron", "delay": 60}
+        ]}
+      ],
+      "quests": {"rotate": true, "prefer": ["raccoon"], "exclude": ["dustbunnies"]}
+    }
+
+Slots run in order, each at its HH:MM time; a slot's jobs run one after
+another. A job may be a name, or a dictionary with the job name plus an
+optional "delay" (seconds to sleep first) and "args" (keyword arguments).
+
+A slot may also "fire" a time-critical action precisely at its time, before
+its jobs run: "force-start", "cron", or {"action": "invite", "args": [quest]}.
+See wait-until.py for details.
+
+With "rotate", the party is invited to the next quest as soon as the last
+one finishes, alongside the slots, rather than by start-quest jobs at fixed
+times; see quest-rotate.py. Quests are picked the same way either way: the
+first preferred quest owned, or else a random one not excluded.
+
+Available jobs: start-quest, quest-invite, quest-force, autosmash,
+autocron, autofeed, pet-report, random-costume.
+"""
+
+import contextlib, datetime, json, logging, os, threading, time
+
+from collections import defaultdict
+
+import catalog
+import habitica
+import webhooks
+
+from scripts import load_script
+
+log = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+autocron = load_script('autocron')
+autofeed = load_script('autofeed')
+autosmash = load_script('autosmash')
+pet_report = load_script('pet-report')
+quest_force = load_script('quest-force')
+quest_invite = load_script('quest-invite')
+quest_list = load_script('quest-list')
+quest_rotate = load_script('quest-rotate')
+random_costume = load_script('random-costume')
+wait_until = load_script('wait-until')
+
+default_quest_exclusions = quest_rotate.default_exclusions
+
+default_schedule = {
+    'slots': [
+        {'at': '23:59', 'fire': 'force-start', 'jobs': [
+            'autosmash',
+            {'job': 'autocron', 'delay': 60},
+        ]},
+    ],
+    'quests': {
+        'rotate': True,
+        'prefer': ['raccoon'],
+        'exclude': default_quest_exclusions,
+    },
+}
+
+def load_schedule():
+    """
+    Read the schedule from disk, falling back to the default schedule.
+
+    Schedule is loaded from: ~/.config/habitica-tools/schedule.json
+    """
+    schedule_file = os.path.expanduser('~/.config/habitica-tools/schedule.json')
+    if os.path.exists(schedule_file):
+        with open(schedule_file) as f:
+            return json.load(f)
+    return default_schedule
+
+def start_quest(session, prefer=(), exclude=()):
+    """
+    Invite the party to an owned quest: the first preferred one we have,
+    otherwise a random one that is not excluded.
+    """
+    quest = quest_rotate.choose_quest(quest_list.owned_quests(session), prefer, exclude)
+    if quest is None:
+        log.info("No suitable quests owned!")
+        return
+    return quest_invite.invite(session, quest)
+
+def start_rotation(session, quests, events=None):
+    """
+    Keep the party questing on a background thread; see quest-rotate.py.
+    """
+    rotation = quest_rotate.QuestRotation(session,
+        quests.get('prefer', ()), quests.get('exclude', default_quest_exclusions), events)
+    thread = threading.Thread(target=rotation.run, name='quest-rotation', daemon=True)
+    thread.start()
+    return thread
+
+def job_table(schedule):
+    """
+    Map job names to functions taking a session and keyword arguments.
+    """
+    quests = schedule.get('quests', {})
+    return {
+        'start-quest': lambda session, **args: start_quest(session,
+            args.get('prefer', quests.get('prefer', ())),
+            args.get('exclude', quests.get('exclude', ()))),
+        'quest-invite': lambda session, quest_id: quest_invite.invite(session, quest_id),
+        'quest-force': lambda session: quest_force.force_start(session),
+        'autosmash': lambda session, **args: autosmash.autosmash(session, **args),
+        'autocron': lambda session: autocron.autocron(session),
+        'autofeed': lambda session: autofeed.autofeed(session, session.profile(autofeed.profile_fields)),
+        'pet-report': lambda session: pet_report.pet_report(session.profile(pet_report.profile_fields), catalog.load(session)),
+        'random-costume': lambda session: random_costume.randomize_costume(session),
+    }
+
+def run_job(session, jobs, spec, latencies):
+    """
+    Run one scheduled job, logging (and recording) how long it took.
+    Failures are logged rather than raised, so that the daemon keeps going.
+    """
+    if isinstance(spec, str): spec = {'job': spec}
+    name = spec['job']
+    if name not in jobs:
+        log.error(f"Unknown job: {name}")
+        return
+    if spec.get('delay'):
+        log.info(f"Waiting {spec['delay']} seconds...")
+        time.sleep(spec['delay'])
+
+    log.info(f"== Running {name} ==")
+    start = time.monotonic()
+    try:
+        failure = jobs[name](session, **spec.get('args', {}))
+        if failure is not None:
+            log.warning(f"{name} did not complete: {failure.name}")
+    except Exception:
+        log.exception(f"{name} failed")
+    elapsed = time.monotonic() - start
+    latencies[name].append(elapsed)
+    log.info(f"{name} finished in {elapsed:.2f}s")
+
+def fire_at(session, then, spec, latencies):
+    """
+    Perform a time-critical action precisely at the given time.
+    """
+    if isinstance(spec, str): spec = {'action': spec}
+    action = spec['action']
+    try:
+        wait_until.fire_at(session, then, action, spec.get('args', ()))
+    except Exception:
+        log.exception(f"{action} failed")
+    # Latency here means how late the action completed, relative to its target.
+    latencies[f'fire {action}'].append((datetime.datetime.now() - then).total_seconds())
+
+def report_latencies(latencies):
+    log.info("Job latencies so far:")
+    for name, times in sorted(latencies.items()):
+        log.info(f"* {name}: {len(times)} runs, " +
+            f"mean {sum(times) / len(times):.2f}s, max {max(times):.2f}s")
+
+def main():
+    schedule = load_schedule()
+    jobs = job_table(schedule)
+    for slot in schedule['slots']:
+        # Validate up front, rather than failing in the middle of the night.
+        wait_until.parse_timestamp(slot['at'])
+
+    session = habitica.session(log=log)
+    latencies = defaultdict(list)
+    quests = schedule.get('quests', {})
+    rotate = quests.get('rotate', False)
+    with webhooks.connect(session, ['questActivity']) if rotate else contextlib.nullcontext() as events:
+        if rotate:
+            start_rotation(session, quests, events)
+        if not schedule['slots']:
+            threading.Event().wait() # Nothing else to do.
+        while True:
+            for slot in schedule['slots']:
+                then = wait_until.parse_timestamp(slot['at'])
+                if 'fire' in slot:
+                    fire_at(session, then, slot['fire'], latencies)
+                else:
+                    wait_until.wait_until(then)
+                for spec in slot['jobs']:
+                    run_job(session, jobs, spec, latencies)
+            report_latencies(latencies)
+
+if __name__ == "__main__":
+    main()
@@ -3,17 +3,25 @@ A script to damage bosses repeatedly.
 For warriors, it casts Brutal Smash repeatedly with optimal STR gear.
 For mages, it casts Burst of Flames repeatedly, without altering gear.
 
-Usage: python autosmash.py [smash-count]
+Usage: python autosmash.py [smash-count] [--policy reddest|spread]
+                            [--exclude-tag tag ...] [--trace] [--profile]
 
 Where smash-count is a fixed number of smashes to perform.
 
 When run with no arguments, the script smashes until pending damage exceeds
 the current boss's HP, or the player runs out of mana, whichever comes first.
+
+The policy decides which task to smash next: the currently reddest one
+(the default), or the one smashed least so far (reddest first among those).
+Tasks with any of the excluded tags (names or IDs) are never smashed.
 """
 
-import enum, logging, sys, time
+import argparse, enum, heapq, itertools, logging, sys
 
+import catalog
 import habitica
+import loadouts
+import tracing
 
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
@@ -25,142 +33,303 @@ class ExitCodes(enum.Enum):
     INSUFFICIENT_MANA = enum.auto()
     NO_SMASH_SKILL = enum.auto()
 
-try:
-    smash_count = None if len(sys.argv) < 2 else int(sys.argv[1])
-except ValueError:
-    log.error(f"Invalid smash-count value '{sys.argv[1]}'; expected integer")
-    sys.exit(ExitCodes.INVALID_INTEGER.value)
-
-session = habitica.session(log=log)
-
-def smash(task, prefix="*"):
-    """Smash the given task, logging the result."""
-    time.sleep(2.8) # NB: Mitigate rate limit causing 401s.
-    result = session.cast(skill, task['id'])
-    session.log.info(f"{prefix} Smashed '{task['text']}' " +
-        f"({round(task['value'], 1)} -> " +
-        f"{round(result['task']['value'], 1)})")
-
-# Get task IDs for smashing.
-# Sort tasks by redness (value).
-# We'll smash the reddest ones first.
-tasks = sorted(session.tasks(), key=lambda t: t['value'])
-
-if len(tasks) == 0:
-    log.error("You have no tasks to use for smashing!")
-    sys.exit(ExitCodes.NO_TASKS_TO_SMASH.value)
-
-# Fetch profile. We need stats for the class, level, and mana checks.
-# We fetch items opportunistically, for later gear optimization.
-log.info("Fetching profile...")
-profile = session.profile('items,stats')
-stats = profile['stats']
-items = profile['items']
-
-if smash_count is None:
-    # Verify that a boss quest is active and discern its HP.
-    log.info("Fetching quest info...")
-    party = session.party()
-    quest = party['quest']
-    if (
-        'active' not in quest or not quest['active'] or
-        'progress' not in quest or not quest['progress'] or
-        'hp' not in quest['progress'] or not quest['progress']['hp']
-    ):
-        log.error("No boss quest is active.")
-        sys.exit(ExitCodes.NO_BOSS_QUEST_ACTIVE.value)
-    boss_hp = quest['progress']['hp']
-else:
-    # Double check that we have enough mana.
-    needed_mana = 10 * smash_count
-    mana = stats['mp']
-    if needed_mana > mana:
-        log.error(f"You need {needed_mana} mana, but only have {mana}!")
-        sys.exit(ExitCodes.INSUFFICIENT_MANA.value)
-    log.info(f"Will use {needed_mana} of {mana} mana.")
-
-skill = None
-optimize_gear = False
-if stats['class'] == 'wizard' and stats['lvl'] >= 11:
-    skill = 'fireball' # Burst of Flames
-elif stats['class'] == 'warrior' and stats['lvl'] >= 11:
-    skill = 'smash' # Brutal Smash
-    optimize_gear = True # Maximize STR while smashing.
-
-if skill is None:
-    log.error(f"You don't have a skill that can be used for smashing!")
-    sys.exit(ExitCodes.NO_SMASH_SKILL.value)
-
-owned = items['gear']['owned']
-equipped = items['gear']['equipped']
-
-def equip(gear):
-    for slot, item in gear.items():
-        if equipped[slot] != item:
-            if item in owned and owned[item]:
-                session.equip('equipped', item)
-                log.info(f"* {slot}: {equipped[slot]} -> {item}")
-                equipped[slot] = item
-            else:
-                log.warning(f'Cannot equip unowned item {item}')
-
-if optimize_gear:
-    # Equip best STR gear.
-    log.info("Equipping best STR gear...")
-    equip({
-        'armor': 'armor_special_finnedOceanicArmor',
-        'head': 'head_special_2',
-        'shield': 'shield_special_lootBag',
-        'weapon': 'weapon_warrior_6',
-        'headAccessory': 'headAccessory_armoire_comicalArrow',
-        'body': 'body_special_aetherAmulet',
-        #'back': 'back_special_aetherCloak',
-        #'eyewear': 'eyewear_special_aetherMask',
-    })
-
-# Autosmash!
-log.info("Applying DPS...")
-if smash_count is None:
-    t = 0
-    while True:
-        # Update current status: pending damage and remaining mana.
-        time.sleep(2) # NB: Mitigate rate limit causing 401s.
-        profile = session.profile('party,stats')
+# Mana cost of both Brutal Smash and Burst of Flames.
+mana_cost = 10
+
+# Name under which the original gear is saved while smashing, so that it
+# can be restored with `python loadouts.py restore` if smashing is cut short.
+# Sessions for one of several accounts add the account's name, e.g.
+# before-autosmash-alice.
+restore_loadout = 'before-autosmash'
+
+# The parts of the profile that smashing reads; see autosmash(). Stats are
+# small, and come with values computed from all of them, so are fetched whole.
+profile_fields = ('stats', 'items.gear.owned', 'items.gear.equipped', 'party.quest', 'tags')
+
+# The parts needed to re-sync pending damage and mana; see DamageTracker.
+sync_fields = ('stats', 'party.quest')
+
+class DamageTracker:
+    """
+    Keeps track of pending boss damage and remaining mana locally, from the
+    results of each cast, so that the server need not be polled every time.
+
+    When a cast result includes the updated user, the numbers are exact.
+    Otherwise, mana is deducted locally and damage is estimated from the
+    average damage per cast observed so far; the tracker then asks to
+    re-sync with the server every `sync_every` casts, or as soon as the
+    estimate gets close to the boss's HP.
+    """
+
+    def __init__(self, profile, sync_every=10):
+        self.sync_every = sync_every
+        self.damage_per_cast = None
+        self.pending = None
+        self.sync(profile)
+
+    def sync(self, profile):
+        """Update from a profile containing (at least) party and stats."""
         progress = profile['party']['quest']['progress']
-        pending_damage = progress['up'] - progress['down']
-        mana = profile['stats']['mp']
-        log.info(f"* {round(pending_damage, 1)} damage queued " +
-            f"vs {round(boss_hp, 1)} HP -- {int(mana)} mana left")
-
-        # Check for termination conditions.
-        if pending_damage >= boss_hp:
-            log.info("Queued damage exceeds boss's remaining HP.")
-            break
-        if mana < 10:
-            log.info("Insufficient mana to continue smashing.")
-            break
-
-        # There is still smashing to be done -- keep going!
-        task = tasks[t % len(tasks)]
-        t += 1
-        smash(task, f"* [{t}]")
-else:
-    for t in range(smash_count):
-        task = tasks[t % len(tasks)]
-        smash(task, f"* [{t+1}/{smash_count}]")
-
-if optimize_gear:
-    # Restore original equipment.
-    log.info("Equipping best INT gear...")
-    equip({
-        'armor': 'armor_special_2',
-        'head': 'head_special_2',
-        'shield': 'shield_special_diamondStave',
-        'weapon': 'weapon_special_nomadsScimitar',
-        #'headAccessory': 'headAccessory_armoire_comicalArrow',
-        'body': 'body_armoire_lifeguardWhistle',
-        'back': 'back_special_aetherCloak',
-        'eyewear': 'eyewear_armoire_tragedyMask',
-    })
-
-log.info("Done! :-)")
+        self._exact(progress['up'] - progress['down'])
+        self.mana = profile['stats']['mp']
+
+    def record(self, result):
+        """Account for one cast, given its result."""
+        self.casts_since_sync += 1
+        user = result.get('user') or {}
+        stats = user.get('stats') or {}
+        progress = ((user.get('party') or {}).get('quest') or {}).get('progress') or {}
+        self.mana = stats['mp'] if 'mp' in stats else self.mana - mana_cost
+        if 'up' in progress:
+            self._exact(progress['up'] - progress.get('down', 0))
+        else:
+            self.exact = False
+            self.pending += self.damage_per_cast or 0
+
+    def should_sync(self, boss_hp):
+        """Whether the local estimate is no longer good enough."""
+        if self.exact: return False
+        if self.damage_per_cast is None: return True # Nothing to estimate with.
+        if self.casts_since_sync >= self.sync_every: return True
+        margin = 2 * (self.damage_per_cast or 0)
+        return self.pending + margin >= boss_hp
+
+    def _exact(self, pending):
+        # Learn the damage per cast from the casts since the last exact value.
+        if self.pending is not None and self.casts_since_sync > 0:
+            self.damage_per_cast = (pending - self._exact_pending) / self.casts_since_sync
+        self.pending = self._exact_pending = pending
+        self.exact = True
+        self.casts_since_sync = 0
+
+class TaskSelector:
+    """
+    Picks the best task to smash next, according to a targeting policy,
+    using a heap keyed by each task's live value.
+
+    Each smash changes the smashed task's value; report it via update()
+    and the task is re-ranked, so selection never works from stale values.
+    """
+
+    policies = ('reddest', 'spread')
+
+    def __init__(self, tasks, policy='reddest', exclude_tags=()):
+        """
+        :param tasks: The tasks to choose from, as returned by session.tasks().
+        :param policy: 'reddest' to always pick the lowest-valued task, or
+                       'spread' to pick the least-smashed task, reddest first.
+        :param exclude_tags: IDs of tags whose tasks must not be smashed.
+        """
+        if policy not in self.policies:
+            raise ValueError(f'Invalid policy: {policy}')
+        self.policy = policy
+        self._heap = []
+        self._tasks = {}
+        self._smashes = {}
+        self._versions = {}
+        self._counter = itertools.count()
+        exclude_tags = set(exclude_tags)
+        for task in tasks:
+            if task.get('type') == 'reward': continue # Cannot be smashed.
+            if exclude_tags.intersection(task.get('tags', ())): continue
+            self._tasks[task['id']] = task
+            self._smashes[task['id']] = 0
+            self._versions[task['id']] = 0
+            self._push(task['id'])
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def next(self):
+        """
+        :return: The task that is currently the best target.
+        """
+        while True:
+            _, _, task_id, version = self._heap[0]
+            if version == self._versions[task_id]:
+                return self._tasks[task_id]
+            heapq.heappop(self._heap) # Stale entry.
+
+    def update(self, task, value):
+        """
+        Record that the given task was smashed, and now has the given value.
+        """
+        task_id = task['id']
+        self._tasks[task_id]['value'] = value
+        self._smashes[task_id] += 1
+        self._versions[task_id] += 1
+        self._push(task_id)
+
+    def _push(self, task_id):
+        value = self._tasks[task_id]['value']
+        key = (self._smashes[task_id], value) if self.policy == 'spread' else (value,)
+        entry = (key, next(self._counter), task_id, self._versions[task_id])
+        heapq.heappush(self._heap, entry)
+
+def tag_ids(tags, names_or_ids):
+    """
+    Resolve tag names (or IDs) to tag IDs, given the profile's tags.
+    """
+    by_name = {tag['name']: tag['id'] for tag in tags}
+    return {by_name.get(tag, tag) for tag in names_or_ids}
+
+def autosmash(session, smash_count=None, sync_every=10, policy='reddest',
+              exclude_tags=()):
+    """
+    Smash the current boss.
+
+    :param session: The HabiticaSession to use.
+    :param smash_count: Number of smashes to perform, or None to smash until
+                        pending damage exceeds the boss's HP or mana runs out.
+    :param sync_every: When smash_count is None and cast results lack quest
+                       progress, re-check it with the server this often.
+    :param policy: Task targeting policy; see TaskSelector.
+    :param exclude_tags: Names or IDs of tags whose tasks must not be smashed.
+    :return: None on success, or the ExitCodes member describing the failure.
+    """
+    def smash(prefix="*"):
+        """Smash the best task, logging and returning the result."""
+        task = selector.next()
+        result = session.cast(skill, task['id'])
+        log.info(f"{prefix} Smashed '{task['text']}' " +
+            f"({round(task['value'], 1)} -> " +
+            f"{round(result['task']['value'], 1)})")
+        selector.update(task, result['task']['value'])
+        return result
+
+    # Fetch tasks, profile and (when smashing until the boss is beaten) quest
+    # info concurrently. We need stats for the class, level, and mana checks.
+    # We need items for gear optimization.
+    log.info("Fetching tasks, profile and quest info...")
+    with tracing.span('fetch'):
+        async_session = habitica.AsyncHabiticaSession(session)
+        calls = [async_session.tasks(), async_session.profile(profile_fields)]
+        if smash_count is None: calls.append(async_session.party())
+        tasks, profile, *party = habitica.run_concurrently(*calls)
+
+    with tracing.span('plan'):
+        # Rank tasks for smashing, e.g. the reddest (lowest value) first.
+        exclude_tags = tag_ids(profile.get('tags', []), exclude_tags)
+        selector = TaskSelector(tasks, policy, exclude_tags)
+
+        if len(selector) == 0:
+            log.error("You have no tasks to use for smashing!")
+            return ExitCodes.NO_TASKS_TO_SMASH
+
+        stats = profile['stats']
+        items = profile['items']
+
+        if smash_count is None:
+            # Verify that a boss quest is active and discern its HP.
+            quest = party[0]['quest']
+            if (
+                'active' not in quest or not quest['active'] or
+                'progress' not in quest or not quest['progress'] or
+                'hp' not in quest['progress'] or not quest['progress']['hp']
+            ):
+                log.error("No boss quest is active.")
+                return ExitCodes.NO_BOSS_QUEST_ACTIVE
+            boss_hp = quest['progress']['hp']
+        else:
+            # Double check that we have enough mana.
+            needed_mana = mana_cost * smash_count
+            mana = stats['mp']
+            if needed_mana > mana:
+                log.error(f"You need {needed_mana} mana, but only have {mana}!")
+                return ExitCodes.INSUFFICIENT_MANA
+            log.info(f"Will use {needed_mana} of {mana} mana.")
+
+        skill = None
+        optimize_gear = False
+        if stats['class'] == 'wizard' and stats['lvl'] >= 11:
+            skill = 'fireball' # Burst of Flames
+        elif stats['class'] == 'warrior' and stats['lvl'] >= 11:
+            skill = 'smash' # Brutal Smash
+            optimize_gear = True # Maximize STR while smashing.
+
+        if skill is None:
+            log.error(f"You don't have a skill that can be used for smashing!")
+            return ExitCodes.NO_SMASH_SKILL
+
+    if optimize_gear:
+        # Remember the original gear, to restore later.
+        equipped = items['gear']['equipped']
+        original = dict(equipped)
+        loadouts.save('-'.join(filter(None, (restore_loadout, session.name))), original)
+        gear_catalog = catalog.load(session)
+
+    try:
+        if optimize_gear:
+            # Equip best STR gear. The equipped gear is updated as each item
+            # goes on, so that a partial change is rolled back too.
+            with tracing.span('equip'):
+                log.info("Equipping best STR gear...")
+                loadouts.apply(session, equipped,
+                    loadouts.best_gear(items['gear']['owned'], gear_catalog, 'str', stats['class']),
+                    gear_catalog)
+
+        # Autosmash!
+        log.info("Applying DPS...")
+        with tracing.span('act'):
+            if smash_count is None:
+                # Track damage and mana locally, re-syncing with the server only
+                # when the local numbers are not exact enough to decide.
+                tracker = DamageTracker(profile, sync_every)
+                planned = int(tracker.mana // mana_cost)
+                log.info(f"Planning up to {planned} smashes with {int(tracker.mana)} mana.")
+                for t in range(planned):
+                    log.info(f"* {round(tracker.pending, 1)} damage queued " +
+                        f"vs {round(boss_hp, 1)} HP -- {int(tracker.mana)} mana left")
+
+                    # Check for termination conditions, confirming estimates first.
+                    if tracker.pending >= boss_hp or tracker.mana < mana_cost:
+                        if not tracker.exact:
+                            tracker.sync(session.profile(sync_fields))
+                    if tracker.pending >= boss_hp:
+                        log.info("Queued damage exceeds boss's remaining HP.")
+                        break
+                    if tracker.mana < mana_cost:
+                        log.info("Insufficient mana to continue smashing.")
+                        break
+
+                    # There is still smashing to be done -- keep going!
+                    tracker.record(smash(f"* [{t+1}/{planned}]"))
+                    if t + 1 < planned and tracker.should_sync(boss_hp):
+                        tracker.sync(session.profile(sync_fields))
+                else:
+                    log.info("Planned smashes complete.")
+            else:
+                for t in range(smash_count):
+                    smash(f"* [{t+1}/{smash_count}]")
+    finally:
+        if optimize_gear:
+            # Restore original equipment, even if smashing was cut short.
+            log.info("Restoring original gear...")
+            with tracing.span('restore'):
+                loadouts.apply(session, equipped, original, gear_catalog)
+
+def main():
+    parser = argparse.ArgumentParser(description="Damage bosses repeatedly.")
+    parser.add_argument('smash_count', nargs='?', metavar='smash-count')
+    parser.add_argument('--policy', choices=TaskSelector.policies, default='reddest')
+    parser.add_argument('--exclude-tag', action='append', default=[], metavar='tag')
+    tracing.setup()
+    args = parser.parse_args()
+
+    try:
+        smash_count = None if args.smash_count is None else int(args.smash_count)
+    except ValueError:
+        log.error(f"Invalid smash-count value '{args.smash_count}'; expected integer")
+        sys.exit(ExitCodes.INVALID_INTEGER.value)
+
+    session = tracing.instrument(habitica.session(log=log))
+    failure = autosmash(session, smash_count,
+        policy=args.policy, exclude_tags=args.exclude_tag)
+    if failure is not None:
+        sys.exit(failure.value)
+
+    log.info(f"Connection reuse: {session.connection_stats()}")
+    log.info("Done! :-)")
+
+if __name__ == "__main__":
+    main()
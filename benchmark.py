@@ -0,0 +1,308 @@
+"""
+A benchmark suite for the automation scripts.
+
+Usage: python benchmark.py [--scales 100,1000,10000] [--repeat 5]
+                           [--output benchmark.json] [--compare old.json]
+
+It generates synthetic accounts at several scales (number of pets, with
+food, tasks and owned gear growing alongside), and measures:
+
+* planning: the pure computation in autofeed's feeding planner, autosmash's
+  task selection and gear selection, and pet-report's tables, without any
+  network access;
+* end to end: wall time and requests per second of autofeed and autosmash
+  against a local fake Habitica server (see fakehabitica.py);
+* payloads: the size of the profile each script downloads, with the
+  userFields it declares, against the whole subtrees it used to ask for.
+
+Results are written as JSON, along with the git commit they were measured
+at. Pass --compare with an earlier results file to see what got faster or
+slower.
+"""
+import argparse, contextlib, datetime, importlib, io, json, logging, os, platform, random, statistics, subprocess, tempfile, time
+
+import autofeed
+import autosmash
+import catalog
+import fakehabitica
+import habitica
+import loadouts
+import ownership
+
+pet_report = importlib.import_module('pet-report')
+random_costume = importlib.import_module('random-costume')
+
+log = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+# The scripts log every action; that would drown out (and skew) the numbers.
+for name in ('autofeed', 'autosmash', 'loadouts', 'catalog', 'pet-report'):
+    logging.getLogger(name).setLevel(logging.WARNING)
+
+default_scales = (100, 1000, 10000)
+
+
+# -- Synthetic data --
+
+def synthetic_content(pet_count, seed=0):
+    """
+    :return: A /content document with enough species and potions for
+             the given number of pets, plus food, quests and gear.
+    """
+    rng = random.Random(seed)
+    potion_count = max(10, int(pet_count ** 0.5))
+    species_count = max(10, pet_count // potion_count + 1)
+    standard = [f'Potion{i}' for i in range(potion_count)]
+    premium = [f'Magic{i}' for i in range(potion_count // 2)]
+    drop_eggs = [f'Species{i}' for i in range(species_count // 2)]
+    quest_eggs = [f'QuestSpecies{i}' for i in range(species_count - len(drop_eggs))]
+    quests = {f'quest{i}': {'category': 'pet', 'boss': {'hp': rng.randint(100, 2000)},
+        'drop': {'items': [{'type': 'eggs', 'key': egg}] * 3}} for i, egg in enumerate(quest_eggs)}
+    gear = {}
+    slots = loadouts.slots
+    for i in range(pet_count):
+        slot = slots[i % len(slots)]
+        gear[f'{slot}_synthetic_{i}'] = {
+            'type': slot, 'klass': rng.choice(['warrior', 'wizard', 'healer', 'rogue', 'armoire']),
+            'twoHanded': slot == 'weapon' and rng.random() < 0.2,
+            **{stat: rng.randint(0, 15) for stat in loadouts.stats},
+        }
+    return {
+        'food': {f'Food{i}': {'target': potion} for i, potion in enumerate(standard * 3)},
+        'dropHatchingPotions': dict.fromkeys(standard, {}),
+        'premiumHatchingPotions': dict.fromkeys(premium, {}),
+        'wackyHatchingPotions': {'Veggie': {}},
+        'dropEggs': dict.fromkeys(drop_eggs, {}),
+        'questEggs': dict.fromkeys(quest_eggs, {}),
+        'specialPets': {f'{drop_eggs[0]}-Veteran': 1},
+        'wackyPets': {f'{drop_eggs[0]}-Veggie': 1},
+        'quests': quests,
+        'bundles': {},
+        'gear': {'flat': gear},
+    }
+
+
+def synthetic_profile(content, pet_count, seed=0):
+    """
+    :return: A profile with the given number of pets (and mounts, food,
+             eggs, quest scrolls, owned gear and tags) drawn from content.
+    """
+    rng = random.Random(seed)
+    species = list(content['dropEggs']) + list(content['questEggs'])
+    kinds = list(content['dropHatchingPotions']) + list(content['premiumHatchingPotions'])
+    all_pets = [f'{s}-{k}' for s in species for k in kinds]
+    rng.shuffle(all_pets)
+    pets = {pet: rng.choice([-1, 5, 10, 20, 30, 45]) for pet in all_pets[:pet_count]}
+    mounts = {pet: True for pet in all_pets[:pet_count] if rng.random() < 0.4}
+    gear = content['gear']['flat']
+    equipped = {slot: f'{slot}_base_0' for slot in loadouts.slots}
+    return {
+        'items': {
+            'pets': pets, 'mounts': mounts,
+            'food': {food: rng.randint(0, 30) for food in content['food']},
+            'eggs': {egg: rng.randint(0, 3) for egg in content['questEggs']},
+            'hatchingPotions': {potion: rng.randint(0, 2) for potion in content['premiumHatchingPotions']},
+            'quests': {quest: rng.randint(0, 2) for quest in content['quests']},
+            'gear': {'owned': dict.fromkeys(gear, True), 'equipped': equipped, 'costume': dict(equipped)},
+        },
+        'stats': {'class': 'warrior', 'lvl': 50, 'mp': 300},
+        'tags': [{'id': 'tag-0', 'name': 'no-smash'}],
+    }
+
+
+def synthetic_tasks(count, seed=0):
+    rng = random.Random(seed)
+    return [{'id': f'task-{i}', 'type': ('habit', 'daily', 'todo', 'reward')[i % 4],
+        'text': f'Task {i}', 'value': rng.uniform(-40, 20),
+        'tags': ['tag-0'] if i % 7 == 0 else []} for i in range(count)]
+
+
+# -- Measurement --
+
+def measure(f, repeat):
+    """
+    Run f() repeat times.
+
+    :return: Dictionary of the min, median and max wall time, in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': statistics.median(times), 'max': max(times), 'runs': repeat}
+
+
+def planning_benchmarks(scale, repeat):
+    """
+    :return: Dictionary of benchmark name -> timings, for planning code only.
+    """
+    content = synthetic_content(scale)
+    stable_catalog = catalog.Catalog(catalog.index_content(content))
+    profile = synthetic_profile(content, scale)
+    tasks = synthetic_tasks(max(100, scale // 10))
+    items = profile['items']
+
+    def feed_plan():
+        autofeed.plan_feeding(profile, stable_catalog)
+
+    def task_selection():
+        selector = autosmash.TaskSelector(tasks, 'reddest', {'tag-0'})
+        for _ in range(50):
+            task = selector.next()
+            selector.update(task, task['value'] + 2.5)
+
+    def gear_selection():
+        loadouts.best_gear(items['gear']['owned'], stable_catalog, 'str', 'warrior')
+
+    def ownership_matrix():
+        ownership.OwnershipMatrix.from_items(items, stable_catalog)
+
+    def report():
+        with contextlib.redirect_stdout(io.StringIO()):
+            pet_report.pet_report(profile, stable_catalog, pet_report.defaultdict(str))
+
+    return {name: measure(f, repeat) for name, f in (
+        ('autofeed.plan_feeding', feed_plan),
+        ('autosmash.task_selection', task_selection),
+        ('loadouts.best_gear', gear_selection),
+        ('ownership.from_items', ownership_matrix),
+        ('pet_report.render', report),
+    )}
+
+
+def payload_benchmarks(scale):
+    """
+    :return: Dictionary of script -> size in bytes of its profile download,
+             with the fields it declares and with those it used to request.
+    """
+    content = synthetic_content(scale)
+    profile = synthetic_profile(content, scale)
+    profile['party'] = {'quest': {'key': 'quest0', 'progress': {'up': 0, 'down': 0}}}
+
+    def size(fields):
+        projected = {}
+        for field in habitica.narrow_fields(fields):
+            fakehabitica.project(profile, field, projected)
+        return len(json.dumps(projected, separators=(',', ':')))
+
+    return {script: {'bytes': size(fields), 'before': size(before)} for script, fields, before in (
+        ('autofeed', autofeed.profile_fields, 'items'),
+        ('autosmash', autosmash.profile_fields, 'items,stats,party,tags'),
+        ('pet-report', pet_report.profile_fields, 'items'),
+        ('quest-list', 'items.quests', 'items'),
+        ('random-costume', random_costume.profile_fields, 'items'),
+    )}
+
+
+def end_to_end_benchmarks(tasks, repeat):
+    """
+    :return: Dictionary of benchmark name -> timings and request rates,
+             for whole script runs against a fresh fake server each time.
+    """
+    results = {}
+    def run(name, script):
+        times = []
+        requests = 0
+        for _ in range(repeat):
+            api = fakehabitica.FakeHabitica(fakehabitica.initial_state(tasks),
+                rate_limit=100000, window=60)
+            server = fakehabitica.serve(api)
+            session = habitica.HabiticaSession('benchmark', base_url=fakehabitica.base_url(server))
+            try:
+                catalog.load(session) # Download content outside the timing.
+                start = time.perf_counter()
+                script(session)
+                times.append(time.perf_counter() - start)
+                requests += api.requests
+            finally:
+                session.close()
+                server.shutdown()
+                server.server_close()
+        results[name] = {
+            'min': min(times), 'median': statistics.median(times), 'max': max(times), 'runs': repeat,
+            'requests_per_second': requests / sum(times),
+        }
+
+    def feed(session):
+        autofeed.autofeed(session, session.profile(autofeed.profile_fields))
+
+    def smash(session):
+        session.invite_quest('rat')
+        session.force_start_quest()
+        autosmash.autosmash(session)
+
+    run('autofeed.end_to_end', feed)
+    run('autosmash.end_to_end', smash)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new):
+    """
+    Log how each benchmark's median changed between two result files.
+    """
+    log.info(f"Comparing {old.get('commit')} -> {new.get('commit')}:")
+    for scale, benchmarks in new['results'].items():
+        for name, timing in benchmarks.items():
+            before = old['results'].get(scale, {}).get(name)
+            if before is None: continue
+            ratio = timing['median'] / before['median'] if before['median'] else float('inf')
+            log.info(f"* [{scale}] {name}: {before['median'] * 1000:.2f} ms -> " +
+                f"{timing['median'] * 1000:.2f} ms ({ratio:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the automation scripts.")
+    parser.add_argument('--scales', default=','.join(map(str, default_scales)),
+        help='comma-separated pet counts')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tasks', type=int, default=300, help='tasks for end-to-end runs')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', metavar='old.json')
+    args = parser.parse_args()
+
+    # Keep catalogs and loadouts from fake servers away from the real ones.
+    habitica.cache_dir = tempfile.mkdtemp(prefix='habitica-benchmark-')
+    loadouts.loadouts_file = os.path.join(habitica.cache_dir, 'loadouts.json')
+
+    results = {}
+    payloads = {}
+    for scale in (int(s) for s in args.scales.split(',')):
+        log.info(f"Planning benchmarks at {scale} pets...")
+        results[f'planning-{scale}'] = planning_benchmarks(scale, args.repeat)
+        payloads[f'payload-{scale}'] = payload_benchmarks(scale)
+    log.info("End-to-end benchmarks...")
+    results['end-to-end'] = end_to_end_benchmarks(args.tasks, args.repeat)
+
+    output = {
+        'commit': git_commit(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'results': results,
+        'payloads': payloads,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    for scale, benchmarks in results.items():
+        for name, timing in benchmarks.items():
+            log.info(f"[{scale}] {name}: median {timing['median'] * 1000:.2f} ms")
+    for scale, scripts in payloads.items():
+        for name, size in scripts.items():
+            log.info(f"[{scale}] {name}: {size['bytes'] / 1000:.1f} kB of profile, instead of " +
+                f"{size['before'] / 1000:.1f} kB ({1 - size['bytes'] / size['before']:.0%} less)")
+    log.info(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), output)
+
+if __name__ == "__main__":
+    main()
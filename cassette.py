@@ -0,0 +1,206 @@
+"""
+The cassette module records Habitica API traffic to a file, and plays it
+back later, so that the tools can be run and benchmarked offline.
+
+It plugs in beneath HabiticaSession as a requests transport adapter:
+RecordingAdapter sends requests for real and records each request/response
+pair, while ReplayAdapter answers requests from the recording without any
+network access. Secrets (API tokens, passwords, email addresses) are
+redacted before anything is written, and cassettes are stored as
+gzip-compressed JSON.
+
+The easiest way to use it is via the environment, with any script:
+
+    HABITICA_RECORD=autofeed.cassette python autofeed.py
+    HABITICA_REPLAY=autofeed.cassette python autofeed.py
+
+Replay is as fast as possible by default; set HABITICA_REPLAY_REALTIME=1
+to reproduce the recorded latencies as well.
+"""
+import atexit, collections, gzip, json, os, time
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+format_version = 1
+
+# JSON fields whose values are never written to a cassette.
+redacted_fields = {'apiToken', 'apiKey', 'password', 'newPassword',
+    'confirmPassword', 'email'}
+
+# Response headers that are not worth recording (or no longer apply, since
+# bodies are stored decoded).
+dropped_headers = {'set-cookie', 'content-encoding', 'content-length',
+    'transfer-encoding', 'connection', 'keep-alive'}
+
+redacted = 'REDACTED'
+
+
+class Cassette:
+    """
+    An ordered list of recorded request/response pairs, held in memory and
+    loaded from or saved to a file.
+    """
+
+    def __init__(self, path, interactions=None):
+        self.path = path
+        self.interactions = [] if interactions is None else interactions
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get('version') != format_version:
+            raise ValueError(f'Unsupported cassette version in {path}')
+        return cls(path, stored['interactions'])
+
+    def save(self, path=None):
+        path = path or self.path
+        temp = f'{path}.{os.getpid()}.tmp'
+        with gzip.open(temp, 'wt', encoding='utf-8') as f:
+            json.dump({'version': format_version, 'interactions': self.interactions},
+                f, separators=(',', ':'))
+        os.replace(temp, path)
+
+    def record(self, request, response, elapsed):
+        """
+        Add a request/response pair, redacting secrets.
+        """
+        self.interactions.append({
+            'request': {
+                'method': request.method,
+                'url': request.url,
+                'body': request_body(request),
+            },
+            'response': {
+                'status': response.status_code,
+                'reason': response.reason,
+                'headers': {k: v for k, v in response.headers.items()
+                    if k.lower() not in dropped_headers},
+                'body': redact_text(response.content.decode('utf-8', errors='replace')),
+            },
+            'elapsed': round(elapsed, 4),
+        })
+
+
+def request_body(request):
+    """
+    :return: The request's body as text, with secrets redacted.
+    """
+    body = request.body
+    if body is None: return None
+    if isinstance(body, bytes): body = body.decode('utf-8', errors='replace')
+    return redact_text(body)
+
+
+def redact_text(text):
+    """
+    Redact secrets from JSON text; other text is returned unchanged.
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return text
+    return json.dumps(redact(data), separators=(',', ':'))
+
+
+def redact(data):
+    if isinstance(data, dict):
+        return {k: redacted if k in redacted_fields and v else redact(v)
+            for k, v in data.items()}
+    if isinstance(data, list):
+        return [redact(v) for v in data]
+    return data
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    A pooled transport that records every request/response pair it sends.
+    """
+
+    def __init__(self, cassette, pool_connections=10, pool_maxsize=10):
+        super().__init__(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        start = time.monotonic()
+        response = super().send(request, **kwargs)
+        response.content # Read the body, so that elapsed covers it.
+        self.cassette.record(request, response, time.monotonic() - start)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    A transport that serves recorded responses, without network access.
+
+    Requests are matched by method, URL and (redacted) body. Repeated
+    identical requests get their recorded responses in the order recorded;
+    once those run out, the last one is served again.
+    """
+
+    # Lets session() know that no real credentials are needed.
+    offline = True
+
+    def __init__(self, cassette, realtime=False):
+        """
+        :param cassette: The Cassette to play back.
+        :param realtime: Whether to wait out each response's recorded latency.
+        """
+        super().__init__()
+        self.realtime = realtime
+        self._responses = collections.defaultdict(collections.deque)
+        for interaction in cassette.interactions:
+            request = interaction['request']
+            key = (request['method'], request['url'], request['body'])
+            self._responses[key].append(interaction)
+
+    def send(self, request, **kwargs):
+        key = (request.method, request.url, request_body(request))
+        queue = self._responses.get(key)
+        if not queue:
+            raise LookupError(f'No recorded response for {request.method} {request.url}')
+        interaction = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.realtime: time.sleep(interaction['elapsed'])
+        return self._response(request, interaction, self.realtime)
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def _response(request, interaction, realtime):
+        recorded = interaction['response']
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response.reason = recorded['reason']
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        if not realtime:
+            # Recorded rate limits would only slow an as-fast-as-possible replay.
+            for name in [h for h in response.headers if h.lower().startswith('x-ratelimit-')]:
+                del response.headers[name]
+        response._content = recorded['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def from_environment(pool_size=10):
+    """
+    Create a transport adapter as requested by the environment:
+    HABITICA_REPLAY (a cassette to play back) or HABITICA_RECORD (a
+    cassette to record, saved at exit).
+
+    :return: The adapter, or None if neither variable is set.
+    """
+    replay = os.environ.get('HABITICA_REPLAY')
+    if replay:
+        realtime = os.environ.get('HABITICA_REPLAY_REALTIME', '') not in ('', '0')
+        return ReplayAdapter(Cassette.load(replay), realtime)
+    record = os.environ.get('HABITICA_RECORD')
+    if record:
+        cassette = Cassette(record)
+        atexit.register(cassette.save)
+        return RecordingAdapter(cassette, pool_size, pool_size)
+    return None
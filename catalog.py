@@ -0,0 +1,218 @@
+"""
+The catalog module provides fast, indexed lookups into Habitica's game
+content: food, eggs, hatching potions, pets, quests and gear.
+
+Habitica publishes all of this as a single multi-megabyte JSON document
+(https://habitica.com/api/v3/content). The catalog downloads it once,
+distills it into the handful of indices the tools need, and stores those
+on disk under ~/.cache/habitica-tools, so that later runs load them in
+milliseconds instead of downloading and parsing the whole document again.
+"""
+import hashlib, logging, os, pickle, threading, time
+
+import habitica
+
+
+# Bump whenever the indices below change shape, to invalidate stored catalogs.
+format_version = 2
+
+# Content changes with Habitica releases; refresh the catalog this often.
+default_max_age = 7 * 24 * 60 * 60
+
+catalog_file = os.path.join(habitica.cache_dir, 'catalog.pickle')
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+
+class Catalog:
+    """
+    Indexed view of Habitica's content.
+
+    Attributes:
+    * food_targets: food -> pet type (potion) that loves it, e.g. Fish -> Skeleton
+    * standard_potions: drop hatching potions, e.g. Base, Skeleton
+    * premium_potions: magic hatching potions, e.g. Amber, Rainbow
+    * wacky_potions: wacky hatching potions, e.g. Veggie, Dessert
+    * drop_eggs: standard species, e.g. Wolf, Fox
+    * quest_eggs: species obtained from quests, e.g. Rat, Gryphon
+    * special_pets: unique pets, which never need feeding, e.g. Wolf-Veteran
+    * wacky_pets: pets that do not eat, e.g. Wolf-Veggie
+    * quests: quest -> dictionary of category, boss_hp and drops,
+              where drops are (item type, item key) pairs
+    * egg_quests: species -> quests dropping its eggs
+    * potion_quests: hatching potion -> quests dropping it
+    * bundles: quest bundle -> quests it contains
+    * gear: gear key -> dictionary of type, klass, special_class, set,
+            two_handed and the str, int, con and per bonuses
+    """
+
+    def __init__(self, indices):
+        self.food_targets = indices['food_targets']
+        self.standard_potions = indices['standard_potions']
+        self.premium_potions = indices['premium_potions']
+        self.wacky_potions = indices['wacky_potions']
+        self.drop_eggs = indices['drop_eggs']
+        self.quest_eggs = indices['quest_eggs']
+        self.special_pets = indices['special_pets']
+        self.wacky_pets = indices['wacky_pets']
+        self.quests = indices['quests']
+        self.egg_quests = indices['egg_quests']
+        self.potion_quests = indices['potion_quests']
+        self.bundles = indices['bundles']
+        self.gear = indices['gear']
+
+    @property
+    def potions(self):
+        """All hatching potions: standard, premium and wacky."""
+        return self.standard_potions | self.premium_potions | self.wacky_potions
+
+    def pet_type_for_food(self, food):
+        """
+        :return: The pet type that loves the given food, or None.
+        """
+        return self.food_targets.get(food)
+
+    def gear_stats(self, key):
+        """
+        :return: The gear's stat dictionary, or None if unknown.
+        """
+        return self.gear.get(key)
+
+    def quest_drops(self, key):
+        """
+        :return: List of (item type, item key) pairs the quest drops.
+        """
+        quest = self.quests.get(key)
+        return quest['drops'] if quest else []
+
+
+# The parts of the content that index_content reads; the rest of the (large)
+# document is discarded as it downloads.
+content_fields = ('bundles', 'dropEggs', 'dropHatchingPotions', 'food', 'gear.flat',
+    'premiumHatchingPotions', 'questEggs', 'quests', 'specialPets',
+    'wackyHatchingPotions', 'wackyPets')
+
+
+def index_content(content):
+    """
+    Distill the full /content document into the catalog's indices.
+
+    :param content: The content object, as returned by session.content().
+    :return: Dictionary of indices, for Catalog's constructor.
+    """
+    quests = {}
+    egg_quests = {}
+    potion_quests = {}
+    for key, quest in content.get('quests', {}).items():
+        drop_items = (quest.get('drop') or {}).get('items') or []
+        drops = [(item.get('type'), item.get('key')) for item in drop_items]
+        quests[key] = {
+            'category': quest.get('category'),
+            'boss_hp': (quest.get('boss') or {}).get('hp'),
+            'drops': drops,
+        }
+        # Quests drop several of the same egg or potion; list each quest once.
+        for item_type, item_key in dict.fromkeys(drops):
+            if item_type == 'eggs':
+                egg_quests.setdefault(item_key, []).append(key)
+            elif item_type == 'hatchingPotions':
+                potion_quests.setdefault(item_key, []).append(key)
+
+    gear = {}
+    for key, item in ((content.get('gear') or {}).get('flat') or {}).items():
+        gear[key] = {
+            'type': item.get('type'),
+            'klass': item.get('klass'),
+            'special_class': item.get('specialClass'),
+            'set': item.get('set'),
+            'two_handed': bool(item.get('twoHanded')),
+            'str': item.get('str', 0) or 0,
+            'int': item.get('int', 0) or 0,
+            'con': item.get('con', 0) or 0,
+            'per': item.get('per', 0) or 0,
+        }
+
+    return {
+        'food_targets': {key: food.get('target')
+            for key, food in content.get('food', {}).items()},
+        'standard_potions': set(content.get('dropHatchingPotions', {})),
+        'premium_potions': set(content.get('premiumHatchingPotions', {})),
+        'wacky_potions': set(content.get('wackyHatchingPotions', {})),
+        'drop_eggs': set(content.get('dropEggs', {})),
+        'quest_eggs': set(content.get('questEggs', {})),
+        'special_pets': set(content.get('specialPets', {})),
+        'wacky_pets': set(content.get('wackyPets', {})),
+        'quests': quests,
+        'egg_quests': egg_quests,
+        'potion_quests': potion_quests,
+        'bundles': {key: bundle.get('bundleKeys', [])
+            for key, bundle in content.get('bundles', {}).items()},
+        'gear': gear,
+    }
+
+
+def load(session, max_age=default_max_age, path=None):
+    """
+    Load the catalog, from disk if a recent enough copy is stored there,
+    or else by downloading Habitica's content (and storing the result).
+
+    :param session: HabiticaSession to download content with, if needed.
+    :param max_age: Maximum age, in seconds, of a stored catalog.
+    :param path: Where the catalog is stored; by default, catalog_file,
+                 or a file alongside it for servers other than Habitica's.
+    :return: The Catalog.
+    """
+    if path is None: path = catalog_path(getattr(session, 'base_url', None))
+    with _lock: # Sessions for several accounts need only one download.
+        return _load(session, max_age, path)
+
+
+def _load(session, max_age, path):
+    stored = _read(path)
+    if stored is not None and time.time() - stored['created'] < max_age:
+        return Catalog(stored['indices'])
+
+    try:
+        indices = index_content(session.content(fields=content_fields))
+    except Exception as exc:
+        if stored is None: raise
+        log.warning(f"Using outdated catalog; content download failed: {exc}")
+        return Catalog(stored['indices'])
+
+    _write(path, {
+        'format': format_version,
+        'created': time.time(),
+        'indices': indices,
+    })
+    return Catalog(indices)
+
+
+def catalog_path(base_url=None):
+    """
+    :return: Where to store the catalog of the server at the given base URL.
+    """
+    if base_url is None or base_url == habitica.default_base_url:
+        return catalog_file
+    digest = hashlib.sha1(base_url.encode()).hexdigest()[:16]
+    return os.path.join(habitica.cache_dir, f'catalog-{digest}.pickle')
+
+
+def _read(path):
+    try:
+        with open(path, 'rb') as f:
+            stored = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if not isinstance(stored, dict) or stored.get('format') != format_version:
+        return None
+    return stored
+
+
+def _write(path, stored):
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'wb') as f:
+        pickle.dump(stored, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp, path)
@@ -0,0 +1,598 @@
+"""
+A local stand-in for the Habitica API, for trying out pacing, concurrency
+and the scripts themselves without touching a real account.
+
+Usage: python fakehabitica.py [--port 8080] [--latency seconds] [--jitter seconds]
+                              [--error-rate fraction] [--rate-limit requests]
+                              [--window seconds] [--tasks count] [--seed n]
+
+Then point the scripts at it:
+
+    HABITICA_BASE_URL=http://localhost:8080/api/v3 python autofeed.py
+
+It implements the endpoints habitica.py uses, with state kept in memory:
+feeding raises a pet's value (turning it into a mount at 50), casting
+spends mana, changes the target task and adds to pending quest damage,
+equipping changes gear, scoring changes a task's value, quests can be
+invited to and force-started, and cron applies pending damage to the boss.
+Webhooks can be registered, and are sent questActivity (invited, started,
+finished) and taskActivity (scored) events, as Habitica would. Every
+response carries Habitica-style X-RateLimit-* headers, and exceeding the
+limit gets a 429. Latency and transient (503) errors can be injected.
+
+Any API token is accepted; each token is rate limited separately, but all
+share one account.
+"""
+import argparse, copy, datetime, http.server, json, math, queue, random, re, threading, time, urllib.parse, urllib.request, uuid
+
+
+# -- Game content --
+
+standard_potions = ['Base', 'White', 'Desert', 'Red', 'Shade', 'Skeleton',
+    'Zombie', 'CottonCandyPink', 'CottonCandyBlue', 'Golden']
+premium_potions = ['Amber', 'Rainbow', 'Ruby']
+drop_eggs = ['Wolf', 'TigerCub', 'PandaCub', 'LionCub', 'Fox', 'FlyingPig',
+    'Dragon', 'Cactus', 'BearCub']
+quest_eggs = ['Rat', 'Gryphon', 'Raccoon']
+foods = {
+    'Meat': 'Base', 'Milk': 'White', 'Potatoe': 'Desert', 'Strawberry': 'Red',
+    'Chocolate': 'Shade', 'Fish': 'Skeleton', 'RottenMeat': 'Zombie',
+    'CottonCandyPink': 'CottonCandyPink', 'CottonCandyBlue': 'CottonCandyBlue',
+    'Honey': 'Golden',
+}
+
+
+def content():
+    """
+    :return: A small but representative /content document.
+    """
+    quests = {
+        'rat': {'key': 'rat', 'category': 'pet', 'boss': {'name': 'The Rat King', 'hp': 1200},
+            'drop': {'items': [{'type': 'eggs', 'key': 'Rat'}] * 3}},
+        'gryphon': {'key': 'gryphon', 'category': 'pet', 'boss': {'name': 'The Fiery Gryphon', 'hp': 300},
+            'drop': {'items': [{'type': 'eggs', 'key': 'Gryphon'}] * 3}},
+        'raccoon': {'key': 'raccoon', 'category': 'pet', 'boss': {'name': 'The Raccoon', 'hp': 800},
+            'drop': {'items': [{'type': 'eggs', 'key': 'Raccoon'}] * 3}},
+        'amber': {'key': 'amber', 'category': 'hatchingPotion', 'boss': {'name': 'Amber', 'hp': 600},
+            'drop': {'items': [{'type': 'hatchingPotions', 'key': 'Amber'}] * 2}},
+        'dustbunnies': {'key': 'dustbunnies', 'category': 'unlockable',
+            'boss': {'name': 'Dust Bunnies', 'hp': 100}, 'drop': {'items': []}},
+    }
+    gear = {}
+    def item(key, type, klass, **stats):
+        gear[key] = {'key': key, 'type': type, 'klass': klass,
+            'str': 0, 'int': 0, 'con': 0, 'per': 0, **stats}
+    for slot in ('weapon', 'shield', 'armor', 'head', 'headAccessory', 'body', 'back', 'eyewear'):
+        item(f'{slot}_base_0', slot, 'base')
+    item('weapon_warrior_6', 'weapon', 'warrior', str=15)
+    item('weapon_wizard_6', 'weapon', 'wizard', int=15, per=5, twoHanded=True)
+    item('weapon_special_1', 'weapon', 'special', str=10, int=5, specialClass='warrior')
+    item('shield_warrior_5', 'shield', 'warrior', con=9)
+    item('shield_special_lootBag', 'shield', 'special', str=8, specialClass='warrior')
+    item('armor_warrior_5', 'armor', 'warrior', con=11)
+    item('armor_special_2', 'armor', 'special', str=6, con=6, specialClass='warrior')
+    item('armor_wizard_5', 'armor', 'wizard', int=12)
+    item('head_warrior_5', 'head', 'warrior', str=12)
+    item('head_wizard_5', 'head', 'wizard', per=10)
+    item('headAccessory_armoire_comicalArrow', 'headAccessory', 'armoire', str=10)
+    item('body_special_aetherAmulet', 'body', 'special', str=10, specialClass='warrior')
+    item('back_special_aetherCloak', 'back', 'special', per=10, specialClass='rogue')
+    item('eyewear_armoire_tragedyMask', 'eyewear', 'armoire', int=4)
+    return {
+        'food': {**{key: {'key': key, 'target': target} for key, target in foods.items()},
+            'Saddle': {'key': 'Saddle'}},
+        'dropHatchingPotions': {key: {'key': key} for key in standard_potions},
+        'premiumHatchingPotions': {key: {'key': key} for key in premium_potions},
+        'wackyHatchingPotions': {'Veggie': {'key': 'Veggie'}},
+        'dropEggs': {key: {'key': key} for key in drop_eggs},
+        'questEggs': {key: {'key': key} for key in quest_eggs},
+        'specialPets': {'Wolf-Veteran': 'veteranWolf'},
+        'wackyPets': {'Wolf-Veggie': True},
+        'quests': quests,
+        'bundles': {},
+        'gear': {'flat': gear},
+    }
+
+
+def initial_state(task_count=30, seed=0):
+    """
+    :return: A fresh account: a level 20 warrior with pets, food, gear,
+             quest scrolls and tasks, in a party with no active quest.
+    """
+    rng = random.Random(seed)
+    pets = {}
+    mounts = {}
+    for egg in drop_eggs + quest_eggs:
+        for potion in standard_potions + premium_potions:
+            roll = rng.random()
+            if roll < 0.3:
+                pets[f'{egg}-{potion}'] = rng.choice([5, 10, 15, 20, 25, 30, 35, 40, 45])
+            elif roll < 0.5: # Raised into a mount.
+                pets[f'{egg}-{potion}'] = -1
+                mounts[f'{egg}-{potion}'] = True
+            elif roll < 0.6: # Raised, then hatched again.
+                mounts[f'{egg}-{potion}'] = True
+    pets['Wolf-Veteran'] = 5
+    owned_gear = {key: True for key in content()['gear']['flat']}
+    equipped = {'weapon': 'weapon_base_0', 'shield': 'shield_base_0', 'armor': 'armor_wizard_5',
+        'head': 'head_wizard_5', 'headAccessory': 'headAccessory_base_0', 'body': 'body_base_0',
+        'back': 'back_special_aetherCloak', 'eyewear': 'eyewear_armoire_tragedyMask'}
+    tasks = []
+    for i in range(task_count):
+        task_type = ('habit', 'daily', 'todo', 'reward')[i % 4]
+        tasks.append({
+            'id': f'00000000-0000-4000-8000-{i:012d}', 'type': task_type,
+            'text': f'Task {i}', 'value': round(rng.uniform(-30, 10), 2),
+            'tags': ['11111111-0000-4000-8000-000000000001'] if i % 5 == 0 else [],
+        })
+    return {
+        'user': {
+            'id': '22222222-0000-4000-8000-000000000000',
+            'auth': {'local': {'username': 'fake', 'email': 'fake@example.com'}},
+            'profile': {'name': 'Fake Warrior'},
+            'stats': {'class': 'warrior', 'lvl': 20, 'hp': 50, 'mp': 200, 'maxMP': 200,
+                'exp': 0, 'gp': 100, 'str': 10, 'int': 5, 'con': 5, 'per': 5},
+            'items': {
+                'pets': pets, 'mounts': mounts,
+                'food': {key: rng.randint(0, 20) for key in foods} | {'Saddle': 2},
+                'eggs': {key: rng.randint(0, 3) for key in drop_eggs + quest_eggs},
+                'hatchingPotions': {key: rng.randint(0, 2) for key in standard_potions + premium_potions},
+                'quests': {'rat': 1, 'raccoon': 2, 'amber': 1, 'dustbunnies': 1},
+                'gear': {'owned': owned_gear, 'equipped': equipped, 'costume': dict(equipped)},
+                'currentPet': '', 'currentMount': '',
+            },
+            'party': {'_id': '33333333-0000-4000-8000-000000000000',
+                'quest': {'key': None, 'progress': {'up': 0, 'down': 0}}},
+            'tags': [{'id': '11111111-0000-4000-8000-000000000001', 'name': 'no-smash'}],
+            'webhooks': [],
+            'notifications': [],
+        },
+        'party': {
+            'id': '33333333-0000-4000-8000-000000000000', 'name': 'Fake Party',
+            'quest': {'key': None, 'active': False, 'members': {}, 'progress': {}},
+        },
+        'tasks': tasks,
+    }
+
+
+# The events each kind of webhook can send, and whether they are sent by
+# default, as in Habitica.
+webhook_options = {
+    'taskActivity': {'created': False, 'updated': False, 'deleted': False,
+        'checklistScored': False, 'scored': True},
+    'userActivity': {'petHatched': False, 'mountRaised': False, 'leveledUp': False},
+    'questActivity': {'questStarted': False, 'questFinished': False, 'questInvited': False},
+    'groupChatReceived': {},
+}
+
+# Failed deliveries after which a webhook is disabled, as in Habitica.
+max_webhook_failures = 10
+
+
+class ApiError(Exception):
+    def __init__(self, status, error, message):
+        super().__init__(message)
+        self.status = status
+        self.error = error
+
+
+class FakeHabitica:
+    """
+    The fake API's state and request handling, independent of HTTP.
+    """
+
+    def __init__(self, state=None, latency=0, jitter=0, error_rate=0,
+                 rate_limit=30, window=60, seed=0):
+        """
+        :param state: Initial account state; see initial_state().
+        :param latency: Seconds to wait before answering each request.
+        :param jitter: Up to this many extra seconds, at random.
+        :param error_rate: Fraction of requests to fail with a 503.
+        :param rate_limit: Requests allowed per API token per window.
+        :param window: Length of the rate limit window, in seconds.
+        """
+        self.state = initial_state(seed=seed) if state is None else state
+        self.content = content()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.window = window
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self._windows = {} # API token -> [remaining, reset time]
+        self._outbox = queue.Queue() # (webhook, event) pairs to deliver
+        self._deliverer = None
+        self.requests = 0
+        self.deliveries = 0
+        self.routes = [
+            ('GET', r'/status', self.status),
+            ('GET', r'/content', self.get_content),
+            ('GET', r'/user', self.get_user),
+            ('GET', r'/groups/party', self.get_party),
+            ('GET', r'/tasks/user', self.get_tasks),
+            ('POST', r'/tasks/(?P<task_id>[^/]+)/score/(?P<direction>[^/]+)', self.score_task),
+            ('GET', r'/user/webhook', self.get_webhooks),
+            ('POST', r'/user/webhook', self.add_webhook),
+            ('DELETE', r'/user/webhook/(?P<webhook_id>[^/]+)', self.delete_webhook),
+            ('POST', r'/user/feed/(?P<pet>[^/]+)/(?P<food>[^/]+)', self.feed),
+            ('POST', r'/user/class/cast/(?P<spell>[^/]+)', self.cast),
+            ('POST', r'/user/equip/(?P<item_type>[^/]+)/(?P<key>[^/]+)', self.equip),
+            ('POST', r'/groups/(?P<group>[^/]+)/quests/invite/(?P<quest>[^/]+)', self.invite_quest),
+            ('POST', r'/groups/(?P<group>[^/]+)/quests/force-start', self.force_start_quest),
+            ('POST', r'/cron', self.cron),
+        ]
+
+    def handle(self, method, path, query, body, api_key):
+        """
+        Handle one request.
+
+        :return: Tuple of (status, headers, JSON-serializable body).
+        """
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0: time.sleep(delay)
+        with self.lock:
+            self.requests += 1
+            headers, limited = self._rate_limit(api_key or '')
+            if limited:
+                return 429, headers, self._error('TooManyRequests', 'Rate limit exceeded.')
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 503, headers, self._error('ServiceUnavailable', 'Injected failure.')
+            if path.startswith('/api/v3'): path = path[len('/api/v3'):]
+            for route_method, pattern, handler in self.routes:
+                match = re.fullmatch(pattern, path)
+                if match is None or route_method != method: continue
+                try:
+                    data = handler(query=query, body=body, **match.groupdict())
+                except ApiError as exc:
+                    return exc.status, headers, self._error(exc.error, str(exc))
+                return 200, headers, copy.deepcopy({'success': True, 'data': data,
+                    'notifications': self.state['user']['notifications']})
+            return 404, headers, self._error('NotFound', f'Not found: {method} {path}')
+
+    # -- Endpoints --
+
+    def status(self, **_):
+        return {'status': 'up'}
+
+    def get_content(self, **_):
+        return self.content
+
+    def get_user(self, query, **_):
+        user = self.state['user']
+        fields = query.get('userFields')
+        if not fields: return user
+        projected = {'id': user['id'], 'notifications': user['notifications']}
+        for field in fields.split(','):
+            project(user, field.strip(), projected)
+        return projected
+
+    def get_party(self, **_):
+        return self.state['party']
+
+    def get_tasks(self, query, **_):
+        task_type = query.get('type')
+        if task_type is None: return self.state['tasks']
+        return [t for t in self.state['tasks'] if f"{t['type']}s" == task_type]
+
+    def score_task(self, task_id, direction, **_):
+        if direction not in ('up', 'down'):
+            raise ApiError(400, 'BadRequest', f'Invalid direction: {direction}')
+        task = next((t for t in self.state['tasks'] if t['id'] == task_id), None)
+        if task is None:
+            raise ApiError(404, 'NotFound', 'Task not found.')
+        user = self.state['user']
+        stats = user['stats']
+        # Habitica's formula: red tasks move faster than blue ones.
+        delta = round(0.9747 ** max(-47.27, min(task['value'], 21.27)), 2)
+        if direction == 'down': delta = -delta
+        task['value'] = round(task['value'] + delta, 2)
+        if direction == 'up':
+            stats['exp'] += 10
+            stats['gp'] = round(stats['gp'] + delta, 2)
+            if self.state['party']['quest'].get('active'):
+                user['party']['quest']['progress']['up'] += 1
+        else:
+            stats['hp'] = max(0, round(stats['hp'] + delta, 2))
+        self._notify('taskActivity', 'scored', task=copy.deepcopy(task),
+            direction=direction, delta=delta)
+        return {**stats, 'delta': delta}
+
+    def get_webhooks(self, **_):
+        return self.state['user']['webhooks']
+
+    def add_webhook(self, body, **_):
+        webhooks = self.state['user']['webhooks']
+        url = body.get('url')
+        if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+            raise ApiError(400, 'BadRequest', 'Invalid webhook URL.')
+        webhook_type = body.get('type', 'taskActivity')
+        if webhook_type not in webhook_options:
+            raise ApiError(400, 'BadRequest', f'Invalid webhook type: {webhook_type}')
+        webhook_id = body.get('id') or str(uuid.uuid4())
+        if any(w['id'] == webhook_id for w in webhooks):
+            raise ApiError(400, 'BadRequest', 'A webhook with that ID already exists.')
+        webhook = {
+            'id': webhook_id, 'url': url, 'label': body.get('label', ''),
+            'type': webhook_type, 'enabled': body.get('enabled', True),
+            'options': {**webhook_options[webhook_type], **(body.get('options') or {})},
+            'failures': 0,
+        }
+        webhooks.append(webhook)
+        return webhook
+
+    def delete_webhook(self, webhook_id, **_):
+        webhooks = self.state['user']['webhooks']
+        if not any(w['id'] == webhook_id for w in webhooks):
+            raise ApiError(404, 'NotFound', 'Webhook not found.')
+        webhooks[:] = [w for w in webhooks if w['id'] != webhook_id]
+        return webhooks
+
+    def feed(self, pet, food, query, **_):
+        items = self.state['user']['items']
+        amount = int(query.get('amount', 1))
+        if items['pets'].get(pet, 0) <= 0:
+            raise ApiError(404, 'NotFound', f"You don't own the pet {pet}.")
+        if pet in self.content['specialPets'] or pet in self.content['wackyPets']:
+            raise ApiError(401, 'NotAuthorized', f"{pet} can't be fed.")
+        if items['food'].get(food, 0) < amount:
+            raise ApiError(401, 'NotAuthorized', f"You don't have enough {food}.")
+        target = self.content['food'].get(food, {}).get('target')
+        # Pets of magic (premium) potions like every food; others only their own.
+        potion = pet.rpartition('-')[2]
+        liked = target == potion or potion in premium_potions
+        value = items['pets'][pet] + amount * (5 if liked else 2)
+        items['food'][food] -= amount
+        if value >= 50:
+            items['pets'][pet] = -1
+            items['mounts'][pet] = True
+            return -1
+        items['pets'][pet] = value
+        return value
+
+    def cast(self, spell, query, **_):
+        user = self.state['user']
+        stats = user['stats']
+        if spell not in ('smash', 'fireball'):
+            raise ApiError(400, 'BadRequest', f'Unsupported spell: {spell}')
+        if stats['mp'] < 10:
+            raise ApiError(401, 'NotAuthorized', 'Not enough mana.')
+        task = next((t for t in self.state['tasks'] if t['id'] == query.get('targetId')), None)
+        if task is None:
+            raise ApiError(404, 'NotFound', 'Task not found.')
+        stat = self._stat('str' if spell == 'smash' else 'int')
+        stats['mp'] -= 10
+        task['value'] = round(task['value'] + 2.5 + stat / 20, 2)
+        if self.state['party']['quest'].get('active'):
+            progress = user['party']['quest']['progress']
+            progress['up'] = round(progress['up'] + 2 + stat / 10, 2)
+        return {'user': {'stats': stats, 'party': user['party']}, 'task': task}
+
+    def equip(self, item_type, key, **_):
+        items = self.state['user']['items']
+        if item_type in ('pet', 'mount'):
+            current = 'currentPet' if item_type == 'pet' else 'currentMount'
+            items[current] = '' if items[current] == key else key
+            return items
+        if item_type not in ('equipped', 'costume'):
+            raise ApiError(400, 'BadRequest', f'Invalid item type: {item_type}')
+        gear = self.content['gear']['flat'].get(key)
+        if gear is None or not items['gear']['owned'].get(key):
+            raise ApiError(404, 'NotFound', f"You don't own {key}.")
+        worn = items['gear'][item_type]
+        slot = gear['type']
+        worn[slot] = f'{slot}_base_0' if worn[slot] == key else key
+        if slot == 'weapon' and gear.get('twoHanded'):
+            worn['shield'] = 'shield_base_0'
+        elif slot == 'shield' and self.content['gear']['flat'].get(worn['weapon'], {}).get('twoHanded'):
+            worn['weapon'] = 'weapon_base_0'
+        return items
+
+    def invite_quest(self, group, quest, **_):
+        party_quest = self.state['party']['quest']
+        scrolls = self.state['user']['items']['quests']
+        if party_quest.get('key'):
+            raise ApiError(401, 'NotAuthorized', 'Your party is already on a quest.')
+        if scrolls.get(quest, 0) <= 0:
+            raise ApiError(401, 'NotAuthorized', "You don't own that quest scroll.")
+        scrolls[quest] -= 1
+        party_quest.update({'key': quest, 'active': False, 'members': {}, 'progress': {}})
+        self.state['user']['party']['quest'].update({'key': quest, 'progress': {'up': 0, 'down': 0}})
+        self._notify_quest('questInvited', quest)
+        return party_quest
+
+    def force_start_quest(self, group, **_):
+        party_quest = self.state['party']['quest']
+        if not party_quest.get('key'):
+            raise ApiError(404, 'NotFound', 'Your party has no pending quest.')
+        if party_quest.get('active'):
+            raise ApiError(401, 'NotAuthorized', 'Your quest has already begun.')
+        boss = self.content['quests'][party_quest['key']].get('boss') or {}
+        party_quest['active'] = True
+        party_quest['progress'] = {'hp': boss.get('hp', 0)}
+        self._notify_quest('questStarted', party_quest['key'])
+        return party_quest
+
+    def cron(self, **_):
+        user_quest = self.state['user']['party']['quest']
+        party_quest = self.state['party']['quest']
+        if party_quest.get('active'):
+            party_quest['progress']['hp'] = max(0, party_quest['progress']['hp'] - user_quest['progress']['up'])
+            if party_quest['progress']['hp'] == 0:
+                # Quest complete!
+                self._notify_quest('questFinished', party_quest['key'])
+                party_quest.update({'key': None, 'active': False, 'members': {}, 'progress': {}})
+                user_quest['key'] = None
+        user_quest['progress'] = {'up': 0, 'down': 0}
+        stats = self.state['user']['stats']
+        stats['mp'] = min(stats['maxMP'], stats['mp'] + 30)
+        return {}
+
+    # -- Internals --
+
+    def _stat(self, stat):
+        """The user's total for a stat: base plus gear, with class bonus."""
+        user = self.state['user']
+        total = user['stats'][stat]
+        for key in user['items']['gear']['equipped'].values():
+            gear = self.content['gear']['flat'].get(key, {})
+            bonus = 1.5 if user['stats']['class'] in (gear.get('klass'), gear.get('specialClass')) else 1
+            total += gear.get(stat, 0) * bonus
+        return total
+
+    def _notify_quest(self, event_type, quest):
+        party = self.state['party']
+        self._notify('questActivity', event_type,
+            group={'id': party['id'], 'name': party['name']}, quest={'key': quest})
+
+    def _notify(self, webhook_type, event_type, **details):
+        """
+        Queue an event for each enabled webhook that asked for it. Events are
+        delivered in order, on a background thread.
+        """
+        user = self.state['user']
+        for webhook in user['webhooks']:
+            if not webhook['enabled'] or webhook['type'] != webhook_type: continue
+            if not webhook['options'].get(event_type): continue
+            event = {'type': event_type, 'webhookType': webhook_type,
+                'user': {'_id': user['id']}, **details}
+            self._outbox.put((webhook, copy.deepcopy(event)))
+        if self._deliverer is None and not self._outbox.empty():
+            self._deliverer = threading.Thread(target=self._deliver, name='webhooks', daemon=True)
+            self._deliverer.start()
+
+    def _deliver(self):
+        while True:
+            webhook, event = self._outbox.get()
+            request = urllib.request.Request(webhook['url'], data=json.dumps(event).encode(),
+                headers={'Content-Type': 'application/json'}, method='POST')
+            try:
+                with urllib.request.urlopen(request, timeout=10):
+                    pass
+                failed = False
+            except OSError:
+                failed = True
+            with self.lock:
+                self.deliveries += 1
+                webhook['failures'] = webhook['failures'] + 1 if failed else 0
+                if webhook['failures'] >= max_webhook_failures:
+                    webhook['enabled'] = False
+
+    def _rate_limit(self, api_key):
+        now = time.time()
+        window = self._windows.get(api_key)
+        if window is None or now >= window[1]:
+            window = self._windows[api_key] = [self.rate_limit, now + self.window]
+        limited = window[0] <= 0
+        if not limited: window[0] -= 1
+        reset = datetime.datetime.fromtimestamp(window[1], datetime.timezone.utc)
+        headers = {
+            'X-RateLimit-Limit': str(self.rate_limit),
+            'X-RateLimit-Remaining': str(window[0]),
+            'X-RateLimit-Reset': reset.strftime('%a %b %d %Y %H:%M:%S GMT+0000 (Coordinated Universal Time)'),
+        }
+        if limited: headers['Retry-After'] = str(math.ceil(window[1] - now))
+        return headers, limited
+
+    @staticmethod
+    def _error(error, message):
+        return {'success': False, 'error': error, 'message': message}
+
+
+def project(source, path, target):
+    """
+    Copy the value at a dotted path (e.g. 'items.pets') from source to target.
+    """
+    *parents, leaf = path.split('.')
+    for key in parents:
+        source = source.get(key) if isinstance(source, dict) else None
+        if source is None: return
+        target = target.setdefault(key, {})
+    if isinstance(source, dict) and leaf in source:
+        target[leaf] = copy.deepcopy(source[leaf])
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def do_POST(self):
+        self._respond('POST')
+
+    def do_DELETE(self):
+        self._respond('DELETE')
+
+    def _respond(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        status, headers, data = self.server.api.handle(method, url.path, query, body,
+            self.headers.get('X-API-Key'))
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(api=None, host='127.0.0.1', port=0, verbose=False):
+    """
+    Start a fake Habitica server on a background thread.
+
+    :param api: The FakeHabitica to serve; defaults to a fresh one.
+    :param port: Port to listen on; 0 picks a free one.
+    :return: The server. Its base URL is base_url(server); stop it with
+             server.shutdown().
+    """
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.api = FakeHabitica() if api is None else api
+    server.verbose = verbose
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server):
+    """The API base URL to give HabiticaSession for the given server."""
+    host, port = server.server_address[:2]
+    return f'http://{host}:{port}/api/v3'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Habitica API server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--jitter', type=float, default=0.05, help='extra random seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of 503s')
+    parser.add_argument('--rate-limit', type=int, default=30, help='requests per window')
+    parser.add_argument('--window', type=float, default=60, help='rate limit window seconds')
+    parser.add_argument('--tasks', type=int, default=30, help='number of tasks')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    api = FakeHabitica(initial_state(args.tasks, args.seed), args.latency, args.jitter,
+        args.error_rate, args.rate_limit, args.window, args.seed)
+    server = serve(api, args.host, args.port, verbose=True)
+    print(f"Fake Habitica listening; use HABITICA_BASE_URL={base_url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,39 @@ It currently implements only a small subset of the available API functions.
 But the groundwork is in place to add more functions easily as needed;
 see https://habitica.com/apidoc/ for Habitica's API documentation.
 """
-import json, os, time
+import asyncio, atexit, collections, contextlib, datetime, email.utils, functools, glob, hashlib, json, os, random, re, threading, time
+import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+# Optional, faster JSON decoding: see decode_json and stream_data.
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Whether large responses are decoded as they arrive. Only worthwhile with
+# ijson's C backend; its pure Python fallback is slower than reading whole.
+streaming = ijson is not None and ijson.backend in ('yajl2_c', 'yajl2_cffi')
 
 
 dev_ids = {
     'restlesscoder': 'd7bff991-881d-4f47-b3f5-4b4885b41a5f'
 }
 
+cache_dir = os.path.expanduser('~/.cache/habitica-tools')
+
+default_base_url = 'https://habitica.com/api/v3'
+
 
 def load_config():
     """
@@ -32,39 +57,930 @@ def load_config():
     return {}
 
 
-def status():
+def accounts(config=None):
+    """
+    List the accounts to act on, for running the scripts across several
+    Habitica users at once. The configuration may list them as:
+
+        {"accounts": [
+            {"name": "alice", "apiToken": "..."},
+            {"name": "bob", "apiToken": "...", "cache": true}
+        ]}
+
+    Each account's values override the rest of the configuration for that
+    account; see session(). Without an "accounts" list, there is just the
+    one unnamed account, configured as usual.
+
+    :param config: Configuration to read; loaded from disk by default.
+    :return: List of dictionaries of per-account configuration values,
+             each with a "name" unless it is the only, unnamed account.
+    """
+    if config is None: config = load_config()
+    listed = config.get('accounts')
+    if not listed: return [{}]
+    return [{'name': account.get('name', f'account{i + 1}'), **account}
+        for i, account in enumerate(listed)]
+
+
+def http_session(pool_size=10, adapter=None):
+    """
+    Create a pooled, keep-alive HTTP session.
+
+    Requests made through the returned session reuse open connections,
+    avoiding a fresh TCP + TLS handshake for every API call.
+
+    :param pool_size: Maximum number of connections kept open per host.
+    :param adapter: Optional transport adapter to send requests with instead,
+                    e.g. a cassette.ReplayAdapter for offline use.
+    :return: A requests.Session with a connection pool mounted.
+    """
+    http = requests.Session()
+    if adapter is None:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    return http
+
+
+def status(http=None, base_url=default_base_url):
     """
     Get Habitica's API status
 
+    :param http: Optional HTTP session (see http_session) to use for the
+                 request, so that its connection can be reused afterward.
+    :param base_url: The API's base URL.
     :return: A truthy value if everything is ok, a falsy value if not
     """
-    response = requests.get('https://habitica.com/api/v3/status')
+    if http is None: http = requests
+    response = http.get(f'{base_url}/status')
     if not response.ok:
         return False
     jsondata = response.json()
     return jsondata['success'] if 'success' in jsondata else False
 
 
-def session(api_token=None, username=None, password=None, log=None):
+def session(api_token=None, username=None, password=None, log=None, pool_size=10,
+            cache=None, history=None, metrics_file=None, transport=None,
+            base_url=None, shared_budget=None, account=None):
     """
     Connect to Habitica.
 
+    :param pool_size: Maximum number of keep-alive connections to hold open.
+    :param cache: Whether to cache profile/party/tasks responses: True for a
+                  default ResponseCache, or a ResponseCache instance. If None,
+                  the "cache" configuration value is used: true, or a
+                  dictionary of ResponseCache arguments.
+    :param history: Whether to record profile/party/tasks snapshots: True
+                    for a default history.History, or a History instance.
+                    If None, the "history" configuration value is used:
+                    true, or a dictionary of History arguments.
+    :param metrics_file: Where to write the session's request metrics at
+                         exit: a .json file for JSON, any other name for
+                         Prometheus' text format. If None, the
+                         HABITICA_METRICS environment variable, or else
+                         the "metrics" configuration value, is used. For
+                         a named account, the name is added to the file
+                         name (e.g. metrics-alice.json), unless the
+                         account configures its own file.
+    :param transport: Optional transport adapter to send requests with (see
+                      http_session). If None, the HABITICA_RECORD and
+                      HABITICA_REPLAY environment variables are checked,
+                      to record or replay a cassette (see cassette.py).
+    :param base_url: The API's base URL, e.g. that of a fakehabitica.py
+                     server. If None, the HABITICA_BASE_URL environment
+                     variable, or else the "baseUrl" configuration value,
+                     or else Habitica's own URL, is used.
+    :param shared_budget: Whether to share the account's rate limit budget
+                          with other processes on this machine (see
+                          SharedRateLimiter). If None, the
+                          "sharedRateLimit" configuration value is used,
+                          which defaults to true.
+    :param account: Configuration values for one of several accounts (see
+                    accounts()), overriding those in the configuration file.
     :return: Habitica session object for performing operations.
     """
-    if not status():
+    config = load_config()
+    if account is not None:
+        config = {k: v for k, v in config.items() if k != 'accounts'}
+        config.update(account)
+    if base_url is None:
+        base_url = os.environ.get('HABITICA_BASE_URL') or config.get('baseUrl', default_base_url)
+
+    if transport is None and (os.environ.get('HABITICA_RECORD') or os.environ.get('HABITICA_REPLAY')):
+        import cassette # Only needed when recording or replaying.
+        transport = cassette.from_environment(pool_size)
+    http = http_session(pool_size, transport)
+    if not status(http, base_url):
         raise RuntimeError("The System is Down!")
 
     if api_token is None and username is None and password is None:
-        config = load_config()
         if 'apiToken' in config:
             api_token = config['apiToken']
+        elif getattr(transport, 'offline', False):
+            api_token = 'offline' # Never sent anywhere.
+
+    if cache is None: cache = config.get('cache', False)
+    if cache is True: cache = ResponseCache()
+    elif isinstance(cache, dict): cache = ResponseCache(**cache)
+    elif cache is False: cache = None
+
+    if history is None: history = config.get('history', False)
+    if history is True or isinstance(history, dict):
+        import history as history_module # Only needed when enabled.
+        history = history_module.History(**(history if isinstance(history, dict) else {}))
+    elif history is False: history = None
+
+    habitica_session = HabiticaSession(api_token, username, password, log,
+        http=http, cache=cache, history=history, base_url=base_url,
+        name=config.get('name'))
+
+    if shared_budget is None: shared_budget = config.get('sharedRateLimit', True)
+    if shared_budget and fcntl is not None and not getattr(transport, 'offline', False):
+        # Keyed by API token, so only known for sure after any login.
+        habitica_session.rate_limiter = SharedRateLimiter.for_account(
+            habitica_session.api_token, base_url)
+
+    own_metrics = False # Whether the file is the account's own.
+    if metrics_file is None:
+        metrics_file = os.environ.get('HABITICA_METRICS')
+        if not metrics_file:
+            metrics_file = config.get('metrics')
+            own_metrics = account is not None and 'metrics' in account
+    if metrics_file:
+        metrics_file = os.path.expanduser(metrics_file)
+        if account is not None and account.get('name') and not own_metrics:
+            # Shared by all accounts: name each account's file after it, so
+            # that they do not overwrite one another at exit.
+            root, ext = os.path.splitext(metrics_file)
+            metrics_file = f"{root}-{account['name']}{ext}"
+        atexit.register(habitica_session.metrics.write, metrics_file)
+
+    return habitica_session
+
+
+def async_session(*args, **kwargs):
+    """
+    Connect to Habitica, for use from asyncio code.
+
+    Takes the same arguments as session().
+
+    :return: AsyncHabiticaSession object for performing operations.
+    """
+    return AsyncHabiticaSession(session(*args, **kwargs))
+
+
+def run_concurrently(*calls):
+    """
+    Run several AsyncHabiticaSession calls concurrently, from synchronous code.
+
+    Example:
+        items, party = habitica.run_concurrently(
+            async_session.profile('items'), async_session.party())
+
+    :param calls: Coroutines, e.g. from AsyncHabiticaSession methods.
+    :return: List of the calls' results, in the order given.
+    """
+    async def gather():
+        return await asyncio.gather(*calls)
+    return asyncio.run(gather())
+
+
+class RateLimiter:
+    """
+    A token bucket that paces requests according to Habitica's rate limit.
+
+    Habitica allows a fixed number of requests per time window (30 per minute
+    at the time of writing), and reports the remaining budget with every
+    response via the X-RateLimit-Remaining and X-RateLimit-Reset headers.
+
+    The limiter lets requests through immediately while the budget is
+    healthy. Once only `reserve` tokens remain, it spreads the remaining
+    requests evenly across the rest of the window; when the budget is
+    exhausted, it waits for the window to reset.
+
+    The limiter is thread-safe, so one instance can be shared by several
+    sessions (or threads) drawing on the same account's budget.
+    """
+
+    def __init__(self, limit=30, window=60, reserve=5):
+        """
+        :param limit: Requests allowed per window, until the server says otherwise.
+        :param window: Length of the rate limit window, in seconds.
+        :param reserve: Remaining budget below which requests are spread out.
+        """
+        self.limit = limit
+        self.window = window
+        self.reserve = reserve
+        self.waited = 0.0
+        self._tokens = limit
+        self._reset_at = None
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token from the bucket, sleeping first if necessary.
+
+        :return: The number of seconds spent waiting.
+        """
+        with self._budget():
+            now = time.time()
+            if self._reset_at is None or now >= self._reset_at:
+                # A new window has begun.
+                self._tokens = max(self._tokens, self.limit)
+                self._reset_at = now + self.window
+            at = max(now, self._next_at)
+            if self._tokens <= 0:
+                # Budget exhausted: wait out the rest of the window.
+                at = max(at, self._reset_at)
+                self._tokens = self.limit
+                self._reset_at = at + self.window
+            elif self._tokens <= self.reserve:
+                # Budget running low: spread remaining tokens over the window.
+                at = max(at, now + (self._reset_at - now) / (self._tokens + 1))
+            self._tokens -= 1
+            self._next_at = at
+            delay = at - now
+            self.waited += delay
+        if delay > 0: time.sleep(delay)
+        return delay
+
+    def update(self, headers):
+        """
+        Synchronize the bucket with the rate limit headers of a response.
+
+        :param headers: The response headers (a case-insensitive mapping).
+        """
+        remaining = _header_int(headers, 'X-RateLimit-Remaining')
+        if remaining is None: return
+        limit = _header_int(headers, 'X-RateLimit-Limit')
+        reset_at = _parse_reset(headers.get('X-RateLimit-Reset'))
+        with self._budget():
+            if limit is not None: self.limit = limit
+            self._tokens = remaining
+            if reset_at is not None: self._reset_at = reset_at
+
+    @property
+    def remaining(self):
+        """The number of requests believed to remain in the current window."""
+        return self._tokens
+
+    @contextlib.contextmanager
+    def _budget(self):
+        """Hold exclusive access to the bucket's state."""
+        with self._lock:
+            yield
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    A RateLimiter whose budget is shared by every process on the machine
+    using the same account, so that e.g. a pet-report.py run while
+    autofeed.py is busy does not assume it has the whole budget to itself.
+
+    The bucket's state lives in a small file under the cache directory,
+    locked with flock() for each update, so concurrent tools add up to the
+    server's limit rather than each spending it in full. Only available
+    where fcntl is (i.e. not on Windows).
+    """
+
+    def __init__(self, path, limit=30, window=60, reserve=5):
+        """
+        :param path: The file holding the shared state; see for_account.
+        """
+        super().__init__(limit, window, reserve)
+        self.path = path
+        self._server_reset_at = None # As last reported, unlike _reset_at.
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+    @classmethod
+    def for_account(cls, account, base_url=default_base_url, **kwargs):
+        """
+        :param account: Something identifying the account (e.g. its API
+                        token), hashed to name the state file.
+        :param base_url: The API's base URL; each server has its own budget.
+        """
+        digest = hashlib.sha1(f'{account} {base_url}'.encode()).hexdigest()[:16]
+        return cls(os.path.join(cache_dir, 'ratelimit', f'{digest}.json'), **kwargs)
+
+    def update(self, headers):
+        remaining = _header_int(headers, 'X-RateLimit-Remaining')
+        if remaining is None: return
+        limit = _header_int(headers, 'X-RateLimit-Limit')
+        reset_at = _parse_reset(headers.get('X-RateLimit-Reset'))
+        with self._budget():
+            # Responses to different processes arrive out of order, so a
+            # stale one must not wind the bucket back to a window it has
+            # moved on from. Nor may any response hand back tokens spent on
+            # requests it does not know about yet: the bucket only moves on
+            # to a new window once the reported reset time has passed, so
+            # its own count never includes requests from an earlier one.
+            if reset_at is not None and self._server_reset_at is not None:
+                moved_on = self._reset_at > self._server_reset_at + 2
+                if reset_at < self._server_reset_at + (2 if moved_on else -2): return
+            if limit is not None: self.limit = limit
+            self._tokens = min(remaining, self._tokens)
+            if reset_at is not None: self._reset_at = self._server_reset_at = reset_at
+
+    @property
+    def remaining(self):
+        with self._budget():
+            return self._tokens
+
+    @contextlib.contextmanager
+    def _budget(self):
+        with self._lock, open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or '{}')
+            except ValueError:
+                state = {} # Damaged; start afresh.
+            self.limit = state.get('limit', self.limit)
+            self._tokens = state.get('tokens', self._tokens)
+            self._reset_at = state.get('reset_at', self._reset_at)
+            self._next_at = state.get('next_at', self._next_at)
+            self._server_reset_at = state.get('server_reset_at', self._server_reset_at)
+            yield
+            f.seek(0)
+            f.truncate()
+            json.dump({'limit': self.limit, 'tokens': self._tokens, 'reset_at': self._reset_at,
+                'next_at': self._next_at, 'server_reset_at': self._server_reset_at}, f)
+
+
+def _unread(response):
+    """Whether a (streamed) response's body has yet to be read."""
+    return response.raw is not None and not response._content_consumed
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _parse_reset(value):
+    """
+    Parse an X-RateLimit-Reset header into a Unix timestamp.
+
+    Habitica sends a JavaScript date string, e.g.
+    "Thu Apr 18 2024 12:34:56 GMT+0000 (Coordinated Universal Time)",
+    but plain epoch seconds/milliseconds are accepted too.
+    """
+    if not value: return None
+    try:
+        number = float(value)
+        if number > 1e12: return number / 1000 # epoch milliseconds
+        if number > 1e9: return number # epoch seconds
+        return time.time() + number # seconds from now
+    except ValueError:
+        pass
+    try:
+        stamp = value.split(' (')[0].strip()
+        # Date strings drop the milliseconds; round up, so as never to
+        # believe that the window has reset before it really has.
+        return datetime.datetime.strptime(stamp, '%a %b %d %Y %H:%M:%S GMT%z').timestamp() + 1
+    except ValueError:
+        return None
+
+
+class RetryPolicy:
+    """
+    Decides whether, and how long after, a failed request should be retried.
+
+    Delays grow exponentially from `base_delay` up to `max_delay`, with
+    random jitter so that concurrent clients do not retry in lockstep.
+    A Retry-After header sent by the server takes precedence.
+
+    Only transient failures are retried: connection errors, timeouts,
+    429 (too many requests) and 5xx responses. Client errors such as 400
+    or 404 will not get any better by asking again, so they fail fast.
+    """
+
+    retryable_statuses = frozenset({408, 429, 500, 502, 503, 504})
+
+    def __init__(self, max_attempts=5, base_delay=1, max_delay=30, jitter=0.5,
+                 timeout=60, retryable_statuses=None):
+        """
+        :param max_attempts: Maximum number of attempts, including the first.
+        :param base_delay: Delay before the first retry, in seconds.
+        :param max_delay: Upper bound on any single delay, in seconds.
+        :param jitter: Fraction (0-1) of each delay that is randomized.
+        :param timeout: Socket timeout for each attempt, in seconds.
+        :param retryable_statuses: HTTP status codes worth retrying.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.timeout = timeout
+        if retryable_statuses is not None:
+            self.retryable_statuses = frozenset(retryable_statuses)
+
+    def is_retryable(self, status_code):
+        return status_code in self.retryable_statuses
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Compute how long to wait after the given (1-based) failed attempt.
+
+        :param attempt: Number of the attempt that just failed.
+        :param retry_after: Server-requested delay in seconds, if any.
+        :return: Number of seconds to sleep before the next attempt.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        return delay * (1 - self.jitter * random.random())
 
-    return HabiticaSession(api_token, username, password, log)
+    @staticmethod
+    def retry_after(headers):
+        """
+        Parse a Retry-After header (delta-seconds or HTTP-date).
+
+        :return: Number of seconds to wait, or None if absent/invalid.
+        """
+        value = headers.get('Retry-After')
+        if not value: return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, when.timestamp() - time.time())
+
+
+class ResponseCache:
+    """
+    An opt-in cache of GET responses, keyed by endpoint and query parameters
+    (e.g. userFields), with an in-memory layer backed by an on-disk layer
+    (under ~/.cache/habitica-tools/responses by default) so that
+    consecutive script runs can share it.
+
+    Entries are fresh for `ttl` seconds. Once stale, an entry that came with
+    an ETag is revalidated with If-None-Match rather than downloaded again.
+    Both layers evict least recently used entries beyond `max_entries`.
+
+    Each entry belongs to a resource ('user', 'party' or 'tasks'); calls that
+    modify a resource invalidate all of its entries.
+    """
+
+    def __init__(self, ttl=300, max_entries=32, directory=None, disk=True):
+        """
+        :param ttl: Seconds for which an entry is served without asking the server.
+        :param max_entries: Maximum number of entries kept in each layer.
+        :param directory: Where to keep the on-disk layer.
+        :param disk: Whether to use the on-disk layer at all.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.directory = None
+        if disk:
+            self.directory = directory or os.path.join(cache_dir, 'responses')
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(resource, url, params=None, account=None):
+        """
+        Compute the cache key for a request.
+
+        :param resource: The resource the response belongs to.
+        :param url: The endpoint URL.
+        :param params: The query parameters, e.g. userFields.
+        :param account: Something identifying the account (e.g. its API
+                        token), so that accounts never see each other's
+                        data. It is hashed, not stored.
+        """
+        query = urllib.parse.urlencode(sorted((params or {}).items()))
+        digest = hashlib.sha1(f'{account} {url}?{query}'.encode()).hexdigest()[:16]
+        return f'{resource}-{digest}'
+
+    def get(self, key):
+        """
+        Look up an entry, fresh or stale.
+
+        :return: Dictionary with 'body' (the JSON-encoded data), 'etag' and
+                 'time' (when it was last known to be current), or None.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        entry = self._read(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def fresh(self, entry):
+        return time.time() - entry['time'] < self.ttl
+
+    def put(self, key, data, etag=None):
+        """
+        Store the given response data under the key.
+        """
+        entry = {'body': json.dumps(data), 'etag': etag, 'time': time.time()}
+        self._remember(key, entry)
+        self._write(key, entry)
+
+    def touch(self, key):
+        """
+        Mark an entry as current again, after successful revalidation.
+        """
+        entry = self.get(key)
+        if entry is None: return
+        entry['time'] = time.time()
+        self._write(key, entry)
+
+    def invalidate(self, *resources):
+        """
+        Discard all entries belonging to the given resources.
+        """
+        prefixes = tuple(f'{resource}-' for resource in resources)
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefixes)]:
+                del self._memory[key]
+        if self.directory is None: return
+        for resource in resources:
+            for path in glob.glob(os.path.join(self.directory, f'{resource}-*.json')):
+                _remove_quietly(path)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _read(self, key):
+        if self.directory is None: return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not entry.get('etag') and not self.fresh(entry):
+            # Stale, and cannot be revalidated: useless.
+            _remove_quietly(path)
+            return None
+        os.utime(path) # Mark as recently used.
+        return entry
+
+    def _write(self, key, entry):
+        if self.directory is None: return
+        path = self._path(key)
+        temp = f'{path}.{os.getpid()}.tmp'
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp, path)
+        paths = glob.glob(os.path.join(self.directory, '*.json'))
+        if len(paths) > self.max_entries:
+            paths.sort(key=_mtime)
+            for old in paths[:len(paths) - self.max_entries]:
+                _remove_quietly(old)
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# URL paths with variable segments, and the labels to report them under.
+endpoint_patterns = [
+    (re.compile(r'/user/equip/([^/]+)/[^/]+$'), r'/user/equip/\1/{key}'),
+    (re.compile(r'/user/feed/[^/]+/[^/]+$'), '/user/feed/{pet}/{food}'),
+    (re.compile(r'/user/class/cast/[^/]+$'), '/user/class/cast/{skill}'),
+    (re.compile(r'/groups/[^/]+/quests/invite/[^/]+$'), '/groups/{group}/quests/invite/{quest}'),
+    (re.compile(r'/tasks/[^/]+/score/([^/]+)$'), r'/tasks/{task}/score/\1'),
+    (re.compile(r'/user/webhook/[^/]+$'), '/user/webhook/{id}'),
+    (re.compile(r'/groups/[^/]+/'), '/groups/{group}/'),
+]
+
+
+def endpoint_label(method, url):
+    """
+    Label a request by its endpoint, e.g. 'POST /user/feed/{pet}/{food}',
+    so that metrics group requests that differ only in their arguments.
+    """
+    path = urllib.parse.urlsplit(url).path
+    if path.startswith('/api/v3'): path = path[len('/api/v3'):]
+    for pattern, template in endpoint_patterns:
+        path, count = pattern.subn(template, path, count=1)
+        if count: break
+    return f'{method} {path}'
+
+
+class Metrics:
+    """
+    Counters and latency histograms describing a session's requests.
+
+    Per endpoint (see endpoint_label), it records the number of requests
+    by status code, a histogram of latencies, the number of retries, and
+    bytes sent and received. Session-wide, it records the time spent
+    waiting on the rate limiter, and the rate limit headroom reported
+    by the server (latest and lowest seen).
+
+    Use snapshot() for the numbers, or write() to save them as JSON or in
+    Prometheus' text format.
+    """
+
+    # Upper bounds, in seconds, of the latency histogram's buckets.
+    buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.pacing_waits = 0
+        self.pacing_seconds = 0.0
+        self.headroom = None
+        self.lowest_headroom = None
+
+    def observe(self, endpoint, status, seconds, sent=0, received=0):
+        """
+        Record one request (attempt).
+
+        :param status: The HTTP status code, or 'error' if none was received.
+        """
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['statuses'][str(status)] = stats['statuses'].get(str(status), 0) + 1
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stats['histogram'][i] += 1
+                    break
+            stats['bytes_sent'] += sent
+            stats['bytes_received'] += received
+
+    def retried(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint)['retries'] += 1
+
+    def received(self, endpoint, size):
+        """Record the size of a body read after the request was observed."""
+        with self._lock:
+            self._endpoint(endpoint)['bytes_received'] += size
+
+    def paced(self, seconds):
+        """Record time spent waiting for the rate limiter."""
+        if seconds <= 0: return
+        with self._lock:
+            self.pacing_waits += 1
+            self.pacing_seconds += seconds
+
+    def rate_limit(self, remaining):
+        """Record the rate limit headroom reported by the server."""
+        if remaining is None: return
+        with self._lock:
+            self.headroom = remaining
+            if self.lowest_headroom is None or remaining < self.lowest_headroom:
+                self.lowest_headroom = remaining
+
+    def snapshot(self):
+        """
+        :return: Dictionary of all metrics, ready to be serialized as JSON.
+                 Histogram counts are per bucket (not cumulative), with
+                 bucket upper bounds listed under 'buckets'.
+        """
+        with self._lock:
+            return {
+                'buckets': [str(b) if b == float('inf') else b for b in self.buckets],
+                'endpoints': {name: {**stats, 'statuses': dict(stats['statuses']),
+                    'histogram': list(stats['histogram'])}
+                    for name, stats in sorted(self._endpoints.items())},
+                'pacing': {'waits': self.pacing_waits, 'seconds': self.pacing_seconds},
+                'rate_limit': {'headroom': self.headroom, 'lowest': self.lowest_headroom},
+            }
+
+    def prometheus(self):
+        """
+        :return: The metrics in Prometheus' text exposition format.
+        """
+        data = self.snapshot()
+        lines = []
+        def family(name, kind, help):
+            lines.append(f'# HELP habitica_{name} {help}')
+            lines.append(f'# TYPE habitica_{name} {kind}')
+        def label(endpoint, **extra):
+            pairs = {'endpoint': endpoint, **extra}
+            return ','.join(f'{k}="{v}"' for k, v in pairs.items())
+
+        endpoints = data['endpoints']
+        family('requests_total', 'counter', 'Requests sent, by endpoint and status.')
+        for name, stats in endpoints.items():
+            for status, count in sorted(stats['statuses'].items()):
+                lines.append(f'habitica_requests_total{{{label(name, status=status)}}} {count}')
+        family('request_seconds', 'histogram', 'Request latency, by endpoint.')
+        for name, stats in endpoints.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, stats['histogram']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else bound
+                lines.append(f'habitica_request_seconds_bucket{{{label(name, le=le)}}} {cumulative}')
+            lines.append(f'habitica_request_seconds_sum{{{label(name)}}} {stats["seconds"]}')
+            lines.append(f'habitica_request_seconds_count{{{label(name)}}} {stats["count"]}')
+        for metric, key, help in (
+            ('retries_total', 'retries', 'Retried requests, by endpoint.'),
+            ('sent_bytes_total', 'bytes_sent', 'Request body bytes sent, by endpoint.'),
+            ('received_bytes_total', 'bytes_received', 'Response body bytes received, by endpoint.'),
+        ):
+            family(metric, 'counter', help)
+            for name, stats in endpoints.items():
+                lines.append(f'habitica_{metric}{{{label(name)}}} {stats[key]}')
+        family('pacing_seconds_total', 'counter', 'Time spent waiting for the rate limiter.')
+        lines.append(f'habitica_pacing_seconds_total {data["pacing"]["seconds"]}')
+        family('pacing_waits_total', 'counter', 'Requests delayed by the rate limiter.')
+        lines.append(f'habitica_pacing_waits_total {data["pacing"]["waits"]}')
+        for metric, key, help in (
+            ('rate_limit_headroom', 'headroom', 'Requests remaining in the rate limit window.'),
+            ('rate_limit_lowest_headroom', 'lowest', 'Lowest rate limit headroom seen.'),
+        ):
+            if data['rate_limit'][key] is None: continue
+            family(metric, 'gauge', help)
+            lines.append(f'habitica_{metric} {data["rate_limit"][key]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Write the metrics to a file: as JSON if its name ends in .json,
+        and in Prometheus' text format otherwise.
+        """
+        text = json.dumps(self.snapshot(), indent=2) if path.endswith('.json') else self.prometheus()
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'w') as f:
+            f.write(text)
+        os.replace(temp, path)
+
+    def _endpoint(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {
+                'count': 0, 'statuses': {}, 'retries': 0,
+                'seconds': 0.0, 'max_seconds': 0.0,
+                'histogram': [0] * len(self.buckets),
+                'bytes_sent': 0, 'bytes_received': 0,
+            }
+        return stats
+
+
+class PreparedCall:
+    """
+    A request built ahead of time by HabiticaSession.prepare, ready to be
+    sent the moment it is called.
+    """
+
+    def __init__(self, session, method, url, params, body, deadline, invalidates):
+        self.session = session
+        self.deadline = deadline
+        self.invalidates = invalidates
+        self.request = session._http.prepare_request(requests.Request(
+            method, url, params=params, json=body, headers=session._headers
+        ))
+        # Resolve proxy and certificate settings the same way requests does,
+        # so that the request goes out over the already-warm connection pool.
+        self.settings = session._http.merge_environment_settings(
+            self.request.url, {}, None, None, None
+        )
+        session.rate_limiter.acquire()
+        self._reserved = True
+
+    def __call__(self):
+        """
+        Send the request (retrying as needed), and return its result.
+        """
+        session = self.session
+        def send(timeout):
+            if not self._reserved: session.metrics.paced(session.rate_limiter.acquire())
+            self._reserved = False
+            return session._observe(self.request.method, self.request.url,
+                lambda: session._http.send(self.request, timeout=timeout, **self.settings))
+        try:
+            return session._result(session._try(send, self.deadline))
+        finally:
+            if session.cache is not None and self.invalidates:
+                session.cache.invalidate(*self.invalidates)
+
+
+def decode_json(text):
+    """
+    Decode a JSON document, with orjson if it is installed (it is several
+    times faster than the json module).
+    """
+    return json.loads(text) if orjson is None else orjson.loads(text)
+
+
+def stream_data(stream, paths=None):
+    """
+    Decode the data of a Habitica response from a file-like object (e.g. a
+    response's raw socket stream) as it arrives, one top-level field of the
+    data at a time, keeping only what is wanted. Peak memory is then about
+    the size of the largest field kept, rather than the whole body twice
+    over (raw and decoded). Requires ijson.
+
+    Only for successful responses whose data is an object; these always
+    have "success": true, so only "data" is decoded.
+
+    :param paths: Dotted paths within the data to keep (see select_paths);
+                  all of it if None.
+    :return: The data.
+    """
+    tops = None if paths is None else {path.split('.', 1)[0] for path in paths}
+    data = {}
+    for key, value in ijson.kvitems(stream, 'data', use_float=True):
+        if tops is None or key in tops: data[key] = value
+    return data if paths is None else select_paths(data, paths)
+
+
+def select_paths(data, paths):
+    """
+    :param paths: Dotted paths within the data, e.g. 'gear.flat'.
+    :return: The data with only the values at the given paths (and the
+             dictionaries leading to them).
+    """
+    selected = {}
+    for path in narrow_fields(paths):
+        *parents, leaf = path.split('.')
+        source, target = data, selected
+        for key in parents:
+            source = source.get(key) if isinstance(source, dict) else None
+            if source is None: break
+            target = target.setdefault(key, {})
+        else:
+            if isinstance(source, dict) and leaf in source: target[leaf] = source[leaf]
+    return selected
+
+
+def narrow_fields(fields):
+    """
+    Reduce a profile projection to the narrowest equivalent userFields.
+
+    Fields may be dotted paths into the user document, e.g. 'items.quests'
+    or 'items.gear.equipped'. Fields already covered by another (such as
+    'items.pets' alongside 'items') are dropped, since the server refuses
+    overlapping paths, and the rest are sorted so that equal projections
+    make equal requests (and share cache entries).
+
+    :param fields: Comma-separated string, or iterable, of fields.
+    :return: Tuple of the fields to request.
+    """
+    if isinstance(fields, str): fields = fields.split(',')
+    fields = sorted({field.strip() for field in fields if field.strip()})
+    narrowed = []
+    for field in fields: # Sorted, so any covering field comes first.
+        if any(field.startswith(f'{other}.') for other in narrowed): continue
+        narrowed.append(field)
+    return tuple(narrowed)
 
 
 class HabiticaSession:
 
-    def __init__(self, api_token=None, username=None, password=None, log=None):
+    # Endpoints that only send a single POST or DELETE, and so can be
+    # built ahead of time; see prepare.
+    preparable = (
+        'cron', 'invite_quest', 'force_start_quest', 'score_task', 'cast',
+        'equip', 'feed', 'add_webhook', 'delete_webhook',
+    )
+
+    def __init__(self, api_token=None, username=None, password=None, log=None,
+                 pool_size=10, http=None, rate_limiter=None, retry_policy=None,
+                 cache=None, history=None, metrics=None, base_url=default_base_url,
+                 name=None):
+        self.log = log
+        self.name = name # Which of several accounts this is, if any.
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.history = history
+        self.metrics = Metrics() if metrics is None else metrics
+        self._last_request = threading.local()
+        self._http = http_session(pool_size) if http is None else http
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self._preparing = threading.local()
+
         self.api_token = api_token
         if username is not None and password is not None:
             self._login(username, password)
@@ -73,17 +989,131 @@ class HabiticaSession:
             raise ValueError('You must specify either an API token, ' +
                 'or a username + password for login')
 
-        self.log = log
+
+    def status(self):
+        """
+        Get Habitica's API status, over this session's pooled connections.
+
+        :return: A truthy value if everything is ok, a falsy value if not
+        """
+        return status(self._http, self.base_url)
+
+
+    def connection_stats(self):
+        """
+        Report how well HTTP connections are being reused.
+
+        :return: Dictionary with the number of requests sent, the number of
+                 connections opened to send them (i.e. TCP + TLS handshakes),
+                 and the number of requests that reused an open connection.
+        """
+        request_count = connection_count = 0
+        adapters = {id(a): a for a in self._http.adapters.values()}
+        for adapter in adapters.values():
+            if not hasattr(adapter, 'poolmanager'): continue # e.g. replaying.
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None: continue
+                request_count += pool.num_requests
+                connection_count += pool.num_connections
+        return {
+            'requests': request_count,
+            'connections': connection_count,
+            'reused': request_count - connection_count,
+        }
+
+
+    def close(self):
+        """
+        Close all pooled connections held by this session.
+        """
+        self._http.close()
+
+
+    def warm_up(self):
+        """
+        Get ready to send requests with minimal delay: resolve DNS, and
+        open (TCP + TLS) a pooled connection to the server, which later
+        requests will reuse.
+
+        :return: The number of seconds warming up took.
+        """
+        start = time.monotonic()
+        if not self.status():
+            self._warn("Habitica reports a bad status while warming up")
+        return time.monotonic() - start
+
+
+    def prepare(self, method, *args, **kwargs):
+        """
+        Build a request ahead of time, to send later with minimal delay.
+
+        The request is fully encoded, and a token is reserved from the
+        rate limiter, so that sending it involves no further preparation.
+        Only endpoints that modify state with a single POST or DELETE
+        request (see preparable) can be prepared; anything else is refused
+        without sending a request.
+
+        Example:
+            call = session.prepare('force_start_quest', deadline=10)
+            ...
+            result = call()
+
+        :param method: Name of the endpoint method, e.g. 'force_start_quest'.
+        :param args: Positional arguments to the endpoint method.
+        :param kwargs: Keyword arguments to the endpoint method.
+        :return: A PreparedCall; call it to send the request.
+        """
+        if method not in self.preparable:
+            raise ValueError(f'Cannot prepare {method}')
+        self._preparing.active = True
+        try:
+            call = getattr(self, method)(*args, **kwargs)
+        finally:
+            self._preparing.active = False
+        if not isinstance(call, PreparedCall):
+            raise ValueError(f'Cannot prepare {method}')
+        return call
 
 
     # -- Cron --
 
 
-    def cron(self):
+    def cron(self, deadline=None):
         """
         This causes cron to run. It will immediately apply damage for incomplete due Dailies.
+
+        :param deadline: Optional maximum number of seconds to spend trying,
+                         including retries.
+        """
+        return self._post(f'{self.base_url}/cron', deadline=deadline,
+            invalidates=('user', 'party', 'tasks'))
+
+
+    # -- Content --
+
+
+    def content(self, language=None, fields=None):
         """
-        return self._post(f'https://habitica.com/api/v3/cron')
+        Get all available content objects: items, pets, quests, gear, etc.
+
+        This is a large document (several megabytes); see the catalog module
+        for a compact, cached, indexed view of it.
+
+        :param language: Optional language code for the content's text.
+        :param fields: Optional dotted paths (e.g. 'gear.flat') of the parts
+                       of the content to keep. The server always sends all
+                       of it, but the rest is discarded as it arrives.
+
+        :return: The content object
+        """
+        params = {}
+        if language is not None:
+            params['language'] = language
+
+        return self._get(f'{self.base_url}/content', params, stream=True,
+            select=None if fields is None else narrow_fields(fields))
 
 
     # -- Group --
@@ -95,29 +1125,36 @@ class HabiticaSession:
 
         :return: Details about the user's party.
         """
-        return self._get('https://habitica.com/api/v3/groups/party')
+        return self._record('party',
+            self._get(f'{self.base_url}/groups/party', resource='party'))
 
 
     # -- Quest --
 
 
-    def invite_quest(self, quest_key, group_id='party'):
+    def invite_quest(self, quest_key, group_id='party', deadline=None):
         """
         Invite users to a quest.
 
         :param group_id: The group_id (or 'party')
         :param quest_key:
+        :param deadline: Optional maximum number of seconds to spend trying,
+                         including retries.
         """
-        return self._post(f'https://habitica.com/api/v3/groups/{group_id}/quests/invite/{quest_key}')
+        return self._post(f'{self.base_url}/groups/{group_id}/quests/invite/{quest_key}', deadline=deadline,
+            invalidates=('user', 'party'))
 
 
-    def force_start_quest(self, group_id='party'):
+    def force_start_quest(self, group_id='party', deadline=None):
         """
         Force-start a pending quest.
 
         :param group_id: The group_id (or 'party')
+        :param deadline: Optional maximum number of seconds to spend trying,
+                         including retries.
         """
-        return self._post(f'https://habitica.com/api/v3/groups/{group_id}/quests/force-start')
+        return self._post(f'{self.base_url}/groups/{group_id}/quests/force-start', deadline=deadline,
+            invalidates=('user', 'party'))
 
 
     # -- Task --
@@ -151,7 +1188,25 @@ class HabiticaSession:
         if due_date is not None:
             params['dueDate'] = due_date
 
-        return self._get('https://habitica.com/api/v3/tasks/user', params)
+        tasks = self._get(f'{self.base_url}/tasks/user', params, resource='tasks')
+        # Only the full task list is a snapshot of the tasks.
+        return tasks if params else self._record('tasks', tasks)
+
+
+    def score_task(self, task_id, direction='up'):
+        """
+        Score a task: check off a daily or todo, or tick a habit.
+
+        :param task_id: The task's ID (or alias).
+        :param direction: Allowed values: up, down
+
+        :return: The user's updated stats, with the task's value change as
+                 "delta".
+        """
+        if not direction in ('up', 'down'):
+            raise ValueError(f'Invalid direction: {direction}')
+        return self._post(f'{self.base_url}/tasks/{task_id}/score/{direction}',
+            invalidates=('user', 'party', 'tasks'))
 
 
     # -- User --
@@ -188,7 +1243,8 @@ class HabiticaSession:
         if target_id is not None:
             params['targetId'] = target_id
 
-        return self._post(f'https://habitica.com/api/v3/user/class/cast/{spell_id}', params)
+        return self._post(f'{self.base_url}/user/class/cast/{spell_id}', params,
+            invalidates=('user', 'party', 'tasks'))
 
 
     def equip(self, item_type, item_key):
@@ -206,7 +1262,8 @@ class HabiticaSession:
         if not item_type in valid_item_types:
             raise ValueError(f'Invalid item type: {item_type}')
 
-        return self._post(f'https://habitica.com/api/v3/user/equip/{item_type}/{item_key}')
+        return self._post(f'{self.base_url}/user/equip/{item_type}/{item_key}',
+            invalidates=('user',))
 
 
     def feed(self, pet, food, amount=None):
@@ -223,11 +1280,69 @@ class HabiticaSession:
         params = {}
         if amount is not None:
             params['amount'] = amount
-        return self._post(f'https://habitica.com/api/v3/user/feed/{pet}/{food}', params)
+        return self._post(f'{self.base_url}/user/feed/{pet}/{food}', params,
+            invalidates=('user',))
         #E.g. https://habitica.com/api/v3/user/feed/Armadillo-Shade/Chocolate?amount=9
         raise RuntimeError('unimplemented')
 
 
+    def webhooks(self):
+        """
+        Get the user's webhooks.
+
+        :return: An array of webhooks.
+        """
+        return self._get(f'{self.base_url}/user/webhook')
+
+
+    def add_webhook(self, url, webhook_type='taskActivity', options=None, label='',
+                    enabled=True, webhook_id=None):
+        """
+        Create a webhook: Habitica will POST each matching event to its URL,
+        as JSON.
+
+        :param url: The URL to send events to.
+        :param webhook_type: The kind of events to send.
+                             Allowed values: taskActivity, groupChatReceived,
+                             userActivity, questActivity
+
+        :param options: Which events of that kind to send, e.g.
+                        {'questFinished': True}; groupChatReceived needs
+                        {'groupId': ...}. Habitica's defaults if None.
+        :param label: Optional label, to recognize the webhook by later.
+        :param enabled: Whether to send events right away.
+        :param webhook_id: Optional UUID for the webhook; Habitica assigns
+                           one if None.
+
+        :return: The created webhook.
+        """
+        valid_webhook_types = (
+            'taskActivity', 'groupChatReceived', 'userActivity', 'questActivity'
+        )
+        if not webhook_type in valid_webhook_types:
+            raise ValueError(f'Invalid webhook type: {webhook_type}')
+
+        body = {'url': url, 'label': label, 'type': webhook_type, 'enabled': enabled}
+        if options is not None:
+            body['options'] = options
+        if webhook_id is not None:
+            body['id'] = webhook_id
+        return self._post(f'{self.base_url}/user/webhook', body=body,
+            invalidates=('user',))
+
+
+    def delete_webhook(self, webhook_id):
+        """
+        Delete a webhook.
+
+        :param webhook_id: The webhook's ID.
+
+        :return: The user's remaining webhooks.
+        """
+        return self._delete(f'{self.base_url}/user/webhook/{webhook_id}',
+            invalidates=('user',))
+
+
     def profile(self, user_fields=None):
         """
         Get the authenticated user's profile.
@@ -254,17 +1369,26 @@ class HabiticaSession:
         * Tags
         * TasksOrder (list of all IDs for Dailys, Habits, Rewards and To Do's).
 
-        :param user_fields: A list of comma-separated user fields to be
-                            returned instead of the entire document.
-                            Notifications are always returned.
+        Scripts should ask for just the fields they read: on accounts with
+        large inventories, the profile is the biggest download of a run.
+
+        :param user_fields: The user fields to be returned instead of the
+                            entire document: a comma-separated string, or
+                            an iterable, of top-level fields (e.g. 'stats')
+                            or dotted paths within them (e.g. 'items.food').
+                            See narrow_fields. Notifications are always
+                            returned.
 
         :return: The user object
         """
         params = {}
+        fields = None
         if user_fields is not None:
-            params['userFields'] = user_fields
+            fields = narrow_fields(user_fields)
+            params['userFields'] = ','.join(fields)
 
-        return self._get('https://habitica.com/api/v3/user', params)
+        return self._record('user',
+            self._get(f'{self.base_url}/user', params, resource='user', stream=True), fields)
 
 
     def _login(self, username, password):
@@ -274,13 +1398,13 @@ class HabiticaSession:
         :param username: Username or email of the user
         :param password: The user's password
         """
-        self._log.info(f'Logging in as {username}...')
+        self._info(f'Logging in as {username}...')
 
         body = {
             'username': username,
             'password': password,
         }
-        result = self._post('https://habitica.com/api/v3/user/auth/local/login', body=body)
+        result = self._post(f'{self.base_url}/user/auth/local/login', body=body)
 
         if 'apiToken' not in result:
             raise ValueError('Invalid login.')
@@ -299,48 +1423,176 @@ class HabiticaSession:
             'X-API-Key': self.api_token,
         }
 
-    def _get(self, url, params=None):
+    def _get(self, url, params=None, deadline=None, resource=None, stream=False, select=None):
+        """
+        :param stream: Whether the response may be large enough to be worth
+                       decoding as it arrives (see stream_data); its data
+                       must be an object.
+        :param select: Optional dotted paths within the data to keep.
+        """
         if params is None: params = {}
-        return self._result(self._try(
-            lambda: requests.get(url, params=params, headers=self._headers)
-        ))
+        stream = stream and streaming
+        if resource is None or self.cache is None:
+            return self._result(self._try(
+                lambda timeout: self._request('GET', url, params=params, timeout=timeout, stream=stream),
+                deadline
+            ), select)
+
+        # Serve from the cache if possible; otherwise revalidate or refetch.
+        key = self.cache.key(resource, url, params, self.api_token)
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.fresh(entry):
+            self._debug(f"Cache hit: {key}")
+            return decode_json(entry['body'])
+        headers = {}
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        response = self._try(
+            lambda timeout: self._request('GET', url, params=params, timeout=timeout,
+                headers=headers, stream=stream),
+            deadline
+        )
+        if response.status_code == 304 and entry is not None:
+            self._debug(f"Cache revalidated: {key}")
+            response.close()
+            self.cache.touch(key)
+            return decode_json(entry['body'])
+        data = self._result(response, select)
+        self.cache.put(key, data, response.headers.get('ETag'))
+        return data
+
+    def _record(self, kind, data, fields=None):
+        """Record a snapshot in the history, if enabled; returns the data."""
+        if self.history is not None:
+            try:
+                self.history.record(kind, data, self.api_token, fields=fields)
+            except Exception as exc:
+                self._warn(f"Could not record {kind} history: {exc}")
+        return data
 
-    def _post(self, url, params=None, body=None):
-        if params is None: params = {}
+    def _post(self, url, params=None, body=None, deadline=None, invalidates=()):
         if body is None: body = {}
-        return self._result(self._try(
-            lambda: requests.post(url, json=body, params=params, headers=self._headers)
-        ))
+        return self._send('POST', url, params, body, deadline, invalidates)
+
+    def _delete(self, url, params=None, deadline=None, invalidates=()):
+        return self._send('DELETE', url, params, None, deadline, invalidates)
 
-    def _try(self, f, max_retries=5, cooldown=20):
+    def _send(self, method, url, params, body, deadline, invalidates):
+        """Send a request that modifies state, or prepare it (see prepare)."""
+        if params is None: params = {}
+        if getattr(self._preparing, 'active', False):
+            return PreparedCall(self, method, url, params, body, deadline, invalidates)
+        try:
+            return self._result(self._try(
+                lambda timeout: self._request(method, url, json=body, params=params, timeout=timeout),
+                deadline
+            ))
+        finally:
+            if self.cache is not None and invalidates:
+                self.cache.invalidate(*invalidates)
+
+    def _request(self, method, url, headers=None, **kwargs):
+        if getattr(self._preparing, 'active', False):
+            # Only _send builds prepared calls; nothing is sent while preparing.
+            raise ValueError(f'Cannot prepare {method} {url}')
+        waited = self.rate_limiter.acquire()
+        if waited > 0:
+            self._debug(f"Paced {method} {url} by {waited:.2f}s")
+        self.metrics.paced(waited)
+        headers = self._headers if headers is None else {**self._headers, **headers}
+        return self._observe(method, url,
+            lambda: self._http.request(method, url, headers=headers, **kwargs))
+
+    def _observe(self, method, url, send):
+        """
+        Send a request via send(), recording its metrics, and update the
+        rate limiter from the response.
+        """
+        endpoint = endpoint_label(method, url)
+        self._last_request.endpoint = endpoint
+        start = time.monotonic()
+        try:
+            response = send()
+        except requests.RequestException:
+            self.metrics.observe(endpoint, 'error', time.monotonic() - start)
+            raise
+        received = _header_int(response.headers, 'Content-Length')
+        if received is None and not _unread(response): received = len(response.content)
+        self.metrics.observe(endpoint, response.status_code, time.monotonic() - start,
+            len(response.request.body or b''), received or 0)
+        self.metrics.rate_limit(_header_int(response.headers, 'X-RateLimit-Remaining'))
+        self.rate_limiter.update(response.headers)
+        return response
+
+    def _try(self, f, deadline=None):
+        """
+        Call f(timeout) until it yields a successful response, retrying
+        transient failures according to this session's retry policy.
+
+        :param f: Function taking a socket timeout and returning a response.
+        :param deadline: Optional maximum number of seconds to spend in total.
+        :return: The first successful response, or the first response whose
+                 failure is not worth retrying.
+        """
+        policy = self.retry_policy
+        expires = None if deadline is None else time.monotonic() + deadline
         errors = []
-        for i in range(1, max_retries + 1):
-            if i > 1: time.sleep(cooldown)
-            prefix = "[{i}/{max_retries}]"
+        for i in range(1, policy.max_attempts + 1):
+            prefix = f"[{i}/{policy.max_attempts}]"
+            timeout = policy.timeout
+            if expires is not None:
+                timeout = min(timeout, max(expires - time.monotonic(), 0.001))
+            retry_after = None
             try:
-                response = f()
+                response = f(timeout)
                 if response.ok: return response
+                response.close() # Its body will not be read.
                 errors.append(str(response.status_code))
                 self._error(f"{prefix} Server returned bad status: {errors[-1]}")
-            except Exception as exc:
+                if not policy.is_retryable(response.status_code): return response
+                retry_after = policy.retry_after(response.headers)
+            except requests.RequestException as exc:
                 self._error(f"{prefix} Error communicating with Habitica: {exc}")
-                errors.append(exc)
-                if i == max_retries: raise exc
+                errors.append(str(exc))
+                if i == policy.max_attempts: raise exc
+            if i == policy.max_attempts: break
+            delay = policy.delay(i, retry_after)
+            if expires is not None and time.monotonic() + delay >= expires:
+                self._error(f"{prefix} Giving up: {deadline}s deadline reached")
+                break
+            self._warn(f"{prefix} Retrying in {delay:.1f}s...")
+            self.metrics.retried(getattr(self._last_request, 'endpoint', None))
+            time.sleep(delay)
         error_lines = "\n* ".join(errors)
-        raise RuntimeError(f"Request failed {max_retries} times:{error_lines}")
+        raise RuntimeError(f"Request failed {len(errors)} times:\n* {error_lines}")
 
-    def _result(self, response):
+    def _result(self, response, select=None):
         if not response.ok:
+            response.close()
             raise RuntimeError(
                 f'Server returned bad status: {response.status_code}'
             )
-        jsondata = response.json()
+        if _unread(response):
+            # Streamed: decode straight from the socket.
+            with contextlib.closing(response):
+                response.raw.decode_content = True
+                data = stream_data(response.raw, select)
+                if 'Content-Length' not in response.headers:
+                    self.metrics.received(getattr(self._last_request, 'endpoint', None),
+                        response.raw.tell())
+            return data
+        jsondata = decode_json(response.content)
         if 'message' in jsondata:
             self._info(jsondata['message'])
         if jsondata['success'] is False:
             raise ValueError('Operation failed.')
-        return jsondata['data']
+        data = jsondata['data']
+        return data if select is None else select_paths(data, select)
+
 
+    def _debug(self, message):
+        if self.log is not None:
+            self.log.debug(message)
 
     def _info(self, message):
         if self.log is not None:
@@ -353,3 +1605,37 @@ class HabiticaSession:
     def _error(self, message):
         if self.log is not None:
             self.log.error(message)
+
+
+class AsyncHabiticaSession:
+    """
+    Asyncio counterpart of HabiticaSession.
+
+    It offers the same endpoint methods, as coroutines. Each call runs the
+    blocking request on a worker thread using the wrapped session, so all
+    concurrent calls share its connection pool, rate limiter and retry policy.
+    """
+
+    def __init__(self, session):
+        """
+        :param session: The HabiticaSession to issue requests through.
+        """
+        self.session = session
+
+
+def _async_endpoint(name):
+    method = getattr(HabiticaSession, name)
+
+    @functools.wraps(method)
+    async def endpoint(self, *args, **kwargs):
+        return await asyncio.to_thread(getattr(self.session, name), *args, **kwargs)
+
+    return endpoint
+
+
+for _name in (
+    'status', 'content', 'cron', 'party', 'invite_quest', 'force_start_quest',
+    'tasks', 'score_task', 'cast', 'equip', 'feed', 'webhooks', 'add_webhook',
+    'delete_webhook', 'profile',
+):
+    setattr(AsyncHabiticaSession, _name, _async_endpoint(_name))
@@ -0,0 +1,300 @@
+"""
+The history module keeps a local record of how an account changes over time.
+
+Each time a HabiticaSession downloads the profile, party or tasks, it can
+record them here (see the "history" configuration value in habitica.py).
+Rather than storing every download in full, the store flattens each document
+into leaf paths such as `items.food.Meat` and keeps only the leaves that
+changed since the previous snapshot, with an occasional full keyframe so
+that any snapshot can be rebuilt quickly. Downloads that changed nothing
+store nothing at all, so frequent snapshots from autoloop.py stay cheap.
+
+Usage: python history.py pets-gained|mounts-gained|food-consumed [days]
+
+The store lives in ~/.local/share/habitica-tools/history.sqlite.
+"""
+import hashlib, json, os, sqlite3, sys, threading, time, zlib
+
+history_file = os.path.expanduser('~/.local/share/habitica-tools/history.sqlite')
+
+schema = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    account TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    taken REAL NOT NULL,
+    keyframe BLOB
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_time ON snapshots (account, kind, taken);
+CREATE TABLE IF NOT EXISTS changes (
+    snapshot INTEGER NOT NULL REFERENCES snapshots (id),
+    path TEXT NOT NULL,
+    old TEXT,
+    new TEXT
+);
+CREATE INDEX IF NOT EXISTS changes_by_path ON changes (path, snapshot);
+CREATE INDEX IF NOT EXISTS changes_by_snapshot ON changes (snapshot);
+"""
+
+
+class History:
+    """
+    A SQLite-backed store of profile, party and tasks snapshots.
+
+    Snapshots are kept per account and kind ('user', 'party' or 'tasks').
+    A profile fetched with only some userFields updates just those fields
+    (which may be dotted paths, e.g. items.food); the rest carry over from
+    the previous snapshot.
+    """
+
+    def __init__(self, path=None, keyframe_every=100):
+        """
+        :param path: Where the SQLite database lives.
+        :param keyframe_every: Store a full copy every this many snapshots,
+                               bounding the work needed to rebuild one.
+        """
+        self.path = path or history_file
+        self.keyframe_every = keyframe_every
+        os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(schema)
+        self._lock = threading.Lock()
+        # (account, kind) -> (flattened state, snapshots since keyframe, snapshot ID)
+        self._latest = {}
+
+    @staticmethod
+    def account_key(account):
+        """
+        Something identifying the account (e.g. its API token), hashed so
+        that the token itself is never stored.
+        """
+        return hashlib.sha1(f'{account}'.encode()).hexdigest()[:16]
+
+    def record(self, kind, data, account=None, taken=None, fields=None):
+        """
+        Record a freshly downloaded document, storing only what changed.
+
+        :param kind: 'user', 'party' or 'tasks'.
+        :param data: The document, as returned by the session.
+        :param account: Something identifying the account; see account_key.
+        :param taken: When the document was downloaded; defaults to now.
+        :param fields: For a profile, the userFields it was fetched with, if
+                       it is not obvious from its top-level fields.
+        :return: The new snapshot's ID, or None if nothing changed.
+        """
+        account = self.account_key(account)
+        taken = time.time() if taken is None else taken
+        new_leaves = flatten(data)
+        with self._lock, self._db:
+            # Other processes may be recording too: take the write lock before
+            # reading the latest snapshot, so that the delta is against it.
+            self._db.execute('BEGIN IMMEDIATE')
+            old, since_keyframe = self._state(account, kind)
+            if kind == 'user':
+                # Only the fields that were fetched can have changed. Other
+                # top-level fields (e.g. notifications) are always sent.
+                fields = set(fields or ())
+                fetched = fields | {key for key in data
+                    if not any(field.split('.', 1)[0] == key for field in fields)}
+                state = {path: value for path, value in old.items()
+                    if not any(path == field or path.startswith(f'{field}.') for field in fetched)}
+                state.update(new_leaves)
+            else:
+                state = new_leaves
+            changes = [(path, old.get(path), value) for path, value in state.items()
+                if old.get(path) != value]
+            changes.extend((path, value, None) for path, value in old.items()
+                if path not in state)
+            if not changes and since_keyframe is not None:
+                return None
+
+            keyframe = None
+            if since_keyframe is None or since_keyframe + 1 >= self.keyframe_every:
+                keyframe = zlib.compress(json.dumps(state).encode())
+            snapshot = self._db.execute(
+                'INSERT INTO snapshots (account, kind, taken, keyframe) VALUES (?, ?, ?, ?)',
+                (account, kind, taken, keyframe)).lastrowid
+            if since_keyframe is not None:
+                self._db.executemany(
+                    'INSERT INTO changes (snapshot, path, old, new) VALUES (?, ?, ?, ?)',
+                    [(snapshot, path, before, after) for path, before, after in changes])
+            self._latest[account, kind] = (state, 0 if keyframe else since_keyframe + 1, snapshot)
+            return snapshot
+
+    def snapshot(self, kind, at=None, account=None):
+        """
+        Rebuild a document as it was at the given time.
+
+        :param kind: 'user', 'party' or 'tasks'.
+        :param at: Time (as from time.time()); defaults to the latest snapshot.
+        :param account: Something identifying the account; see account_key.
+        :return: The document, or None if there was no snapshot by then.
+                 Lists of objects with IDs (e.g. tasks) come back as
+                 dictionaries keyed by ID.
+        """
+        account = self.account_key(account)
+        with self._lock:
+            leaves = self._rebuild(account, kind, at)
+        return None if leaves is None else unflatten(leaves)
+
+    def changes(self, prefix, since=None, until=None, kind='user', account=None):
+        """
+        List the changes to leaves under the given path prefix.
+
+        :param prefix: Path prefix, e.g. 'items.pets.'.
+        :param since: Only changes at or after this time.
+        :param until: Only changes before this time.
+        :return: List of (time, path, old value, new value), oldest first,
+                 where a value of None means the leaf was absent.
+        """
+        rows = self._query(
+            'SELECT s.taken, c.path, c.old, c.new FROM changes c '
+            'JOIN snapshots s ON s.id = c.snapshot '
+            'WHERE c.path >= ? AND c.path < ? AND s.account = ? AND s.kind = ? '
+            'AND s.taken >= ? AND s.taken < ? ORDER BY s.taken, c.path',
+            prefix, kind, account, since, until)
+        return [(taken, path, _decode(old), _decode(new)) for taken, path, old, new in rows]
+
+    def gained(self, prefix, since=None, until=None, kind='user', account=None):
+        """
+        :return: Leaves under the prefix that appeared, or became truthy
+                 and non-negative, in the given period; e.g. new pets.
+        """
+        return [path[len(prefix):] for taken, path, old, new in
+            self.changes(prefix, since, until, kind, account)
+            if _present(new) and not _present(old)]
+
+    def consumed(self, prefix, since=None, until=None, kind='user', account=None):
+        """
+        :return: Dictionary of leaf -> total decrease over the given period,
+                 for numeric leaves under the prefix; e.g. food eaten.
+                 Only decreases seen by a snapshot so far are counted;
+                 autofeed records one after feeding, for this.
+        """
+        rows = self._query(
+            'SELECT substr(c.path, ?), SUM(CAST(c.old AS REAL) - CAST(COALESCE(c.new, 0) AS REAL)) '
+            'FROM changes c JOIN snapshots s ON s.id = c.snapshot '
+            'WHERE c.path >= ? AND c.path < ? AND s.account = ? AND s.kind = ? '
+            'AND s.taken >= ? AND s.taken < ? '
+            'AND CAST(COALESCE(c.new, 0) AS REAL) < CAST(c.old AS REAL) '
+            'GROUP BY c.path ORDER BY c.path',
+            prefix, kind, account, since, until, leading=(len(prefix) + 1,))
+        return {leaf: amount for leaf, amount in rows}
+
+    def close(self):
+        self._db.close()
+
+    # -- Internals --
+
+    def _query(self, sql, prefix, kind, account, since, until, leading=()):
+        params = (*leading, prefix, prefix + '\uffff', self.account_key(account), kind,
+            float('-inf') if since is None else since,
+            float('inf') if until is None else until)
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _state(self, account, kind):
+        """
+        :return: The latest flattened state, and the number of snapshots
+                 since the last keyframe (None if there are no snapshots).
+                 The cached state is used only if no other process has
+                 recorded a snapshot since.
+        """
+        latest = self._db.execute('SELECT MAX(id) FROM snapshots WHERE account = ? AND kind = ?',
+            (account, kind)).fetchone()[0]
+        cached = self._latest.get((account, kind))
+        if cached is None or cached[2] != latest:
+            leaves = self._rebuild(account, kind)
+            since_keyframe = None
+            if leaves is not None:
+                since_keyframe = self._db.execute(
+                    'SELECT COUNT(*) FROM snapshots WHERE account = ? AND kind = ? AND id > '
+                    '(SELECT MAX(id) FROM snapshots WHERE account = ? AND kind = ? '
+                    'AND keyframe IS NOT NULL)', (account, kind, account, kind)).fetchone()[0]
+            cached = self._latest[account, kind] = (leaves or {}, since_keyframe, latest)
+        return cached[:2]
+
+    def _rebuild(self, account, kind, at=None):
+        at = float('inf') if at is None else at
+        row = self._db.execute(
+            'SELECT id, keyframe FROM snapshots WHERE account = ? AND kind = ? '
+            'AND keyframe IS NOT NULL AND taken <= ? ORDER BY id DESC LIMIT 1',
+            (account, kind, at)).fetchone()
+        if row is None: return None
+        keyframe_id, keyframe = row
+        leaves = json.loads(zlib.decompress(keyframe))
+        for path, new in self._db.execute(
+            'SELECT c.path, c.new FROM changes c JOIN snapshots s ON s.id = c.snapshot '
+            'WHERE s.account = ? AND s.kind = ? AND s.id > ? AND s.taken <= ? '
+            'ORDER BY s.id', (account, kind, keyframe_id, at)):
+            if new is None: leaves.pop(path, None)
+            else: leaves[path] = new
+        return leaves
+
+
+def flatten(data, prefix=''):
+    """
+    Flatten a JSON document into a dictionary of leaf path -> JSON-encoded
+    value. Lists of objects with IDs are keyed by ID, so that reordering
+    tasks does not count as a change; other lists are leaves.
+    """
+    leaves = {}
+    if isinstance(data, list) and data and all(isinstance(x, dict) and 'id' in x for x in data):
+        data = {x['id']: x for x in data}
+    if isinstance(data, dict) and data:
+        for key, value in data.items():
+            leaves.update(flatten(value, f'{prefix}{key}.'))
+    else:
+        leaves[prefix[:-1]] = json.dumps(data, sort_keys=True)
+    return leaves
+
+
+def unflatten(leaves):
+    """
+    Rebuild a document from its flattened leaves.
+    """
+    data = {}
+    for path, value in leaves.items():
+        *parents, leaf = path.split('.')
+        node = data
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = json.loads(value)
+    return data
+
+
+def _decode(value):
+    return None if value is None else json.loads(value)
+
+
+def _present(value):
+    if value is None or value is False: return False
+    if isinstance(value, (int, float)): return value > 0
+    return True
+
+
+def main():
+    reports = {
+        'pets-gained': ('items.pets.', 'gained'),
+        'mounts-gained': ('items.mounts.', 'gained'),
+        'food-consumed': ('items.food.', 'consumed'),
+    }
+    if len(sys.argv) not in (2, 3) or sys.argv[1] not in reports:
+        print(__doc__[__doc__.index('Usage'):].splitlines()[0])
+        sys.exit(1)
+    days = float(sys.argv[2]) if len(sys.argv) == 3 else 7
+    prefix, query = reports[sys.argv[1]]
+
+    import habitica
+    history = History()
+    account = habitica.load_config().get('apiToken')
+    results = getattr(history, query)(prefix, since=time.time() - days * 86400, account=account)
+    if not results:
+        print(f"Nothing in the last {days:g} days.")
+    elif query == 'gained':
+        for name in results: print(name)
+    else:
+        for name, amount in results.items(): print(f"{name}: {amount:g}")
+
+if __name__ == "__main__":
+    main()
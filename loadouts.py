@@ -0,0 +1,203 @@
+"""
+The loadouts module picks and applies sets of gear.
+
+It can compute the best owned gear for a given stat (STR, INT, CON or PER),
+apply a loadout with as few equip calls as possible, and save and restore
+named loadouts in ~/.config/habitica-tools/loadouts.json.
+
+Usage: python loadouts.py best str|int|con|per
+       python loadouts.py save name
+       python loadouts.py restore name
+
+Gear stats come from the content catalog (see catalog.py). As in Habitica
+itself, gear of the player's own class gives 50% more of each stat.
+Habitica has no set bonuses, so each slot can be chosen independently --
+except that a two-handed weapon leaves no room for a shield.
+"""
+import json, logging, os, sys, threading
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock() # Serializes saves from sessions on several threads.
+
+slots = ('weapon', 'shield', 'armor', 'head', 'headAccessory', 'body',
+    'back', 'eyewear')
+
+stats = ('str', 'int', 'con', 'per')
+
+class_bonus = 1.5
+
+loadouts_file = os.path.expanduser('~/.config/habitica-tools/loadouts.json')
+
+
+def stat_value(gear, stat, player_class=None):
+    """
+    :param gear: The gear's catalog entry (see Catalog.gear_stats).
+    :param stat: One of 'str', 'int', 'con' or 'per'.
+    :param player_class: The player's class, e.g. 'warrior', for class bonus.
+    :return: How much of the stat the gear gives the player.
+    """
+    value = gear[stat]
+    if player_class is not None and player_class in (gear['klass'], gear['special_class']):
+        value *= class_bonus
+    return value
+
+
+def best_gear(owned, catalog, stat, player_class=None):
+    """
+    Compute the owned gear that maximizes the given stat.
+
+    This is a single pass over the owned gear, keeping the best item per
+    slot, so it stays fast however much gear the player owns.
+
+    :param owned: The profile's items.gear.owned dictionary.
+    :param catalog: The content Catalog.
+    :param stat: One of 'str', 'int', 'con' or 'per'.
+    :param player_class: The player's class, e.g. 'warrior', for class bonus.
+    :return: Dictionary of slot -> item key, for slots where some owned
+             item gives the stat. A two-handed weapon comes with an empty
+             shield slot.
+    """
+    if stat not in stats:
+        raise ValueError(f'Invalid stat: {stat}')
+
+    # Best (value, key) per slot; two-handed weapons are tracked separately.
+    best = {}
+    best_two_handed = None
+    for key, is_owned in owned.items():
+        if not is_owned: continue
+        gear = catalog.gear_stats(key)
+        if gear is None or gear['type'] not in slots: continue
+        value = stat_value(gear, stat, player_class)
+        if value <= 0: continue
+        if gear['type'] == 'weapon' and gear['two_handed']:
+            if best_two_handed is None or value > best_two_handed[0]:
+                best_two_handed = (value, key)
+        elif gear['type'] not in best or value > best[gear['type']][0]:
+            best[gear['type']] = (value, key)
+
+    loadout = {slot: key for slot, (value, key) in best.items()}
+    if best_two_handed is not None:
+        one_handed = sum(best[slot][0] for slot in ('weapon', 'shield') if slot in best)
+        if best_two_handed[0] > one_handed:
+            loadout['weapon'] = best_two_handed[1]
+            loadout['shield'] = empty('shield')
+    return loadout
+
+
+def apply(session, current, loadout, catalog=None, item_type='equipped'):
+    """
+    Equip a loadout, skipping every slot that already holds the right item.
+
+    Each equip call goes through the session, and hence through its shared
+    rate limiter, so applying a loadout never overruns the rate budget.
+
+    :param session: The HabiticaSession to use.
+    :param current: The currently worn gear (items.gear.equipped, or
+                    items.gear.costume); updated in place as items change.
+    :param loadout: Dictionary of slot -> item key to wear, where
+                    e.g. 'shield_base_0' means an empty shield slot.
+    :param catalog: The content Catalog, to recognize two-handed weapons.
+    :param item_type: 'equipped' for battle gear, or 'costume'.
+    :return: The number of equip calls made.
+    """
+    calls = 0
+    # The weapon goes first, since a two-handed weapon takes off the shield.
+    for slot in sorted(loadout, key=lambda slot: slot != 'weapon'):
+        item = loadout[slot]
+        worn = current.get(slot, empty(slot))
+        if worn == item: continue
+        if item == empty(slot):
+            # Equipping the worn item again takes it off.
+            session.equip(item_type, worn)
+        else:
+            session.equip(item_type, item)
+        log.info(f"* {slot}: {worn} -> {item}")
+        calls += 1
+        current[slot] = item
+        if slot == 'weapon' and _is_two_handed(catalog, item):
+            current['shield'] = empty('shield')
+        elif slot == 'shield' and _is_two_handed(catalog, current.get('weapon')):
+            current['weapon'] = empty('weapon')
+    return calls
+
+
+def empty(slot):
+    """
+    :return: The placeholder item Habitica reports for an empty slot.
+    """
+    return f'{slot}_base_0'
+
+
+def _is_two_handed(catalog, key):
+    if catalog is None: return False
+    gear = catalog.gear_stats(key)
+    return bool(gear and gear['two_handed'])
+
+
+def saved_loadouts(path=None):
+    """
+    :return: Dictionary of name -> loadout, as saved on disk.
+    """
+    path = path or loadouts_file
+    if not os.path.exists(path): return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(name, loadout, path=None):
+    """
+    Save a loadout under the given name, replacing any of the same name.
+    """
+    path = path or loadouts_file
+    with _lock:
+        saved = saved_loadouts(path)
+        saved[name] = {slot: loadout[slot] for slot in slots if slot in loadout}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'w') as f:
+            json.dump(saved, f, indent=2)
+        os.replace(temp, path)
+
+
+def restore(session, name, current, catalog=None, item_type='equipped', path=None):
+    """
+    Equip a previously saved loadout.
+
+    :return: The number of equip calls made.
+    """
+    saved = saved_loadouts(path)
+    if name not in saved:
+        raise KeyError(f'No such loadout: {name}')
+    return apply(session, current, saved[name], catalog, item_type)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    if len(sys.argv) != 3 or sys.argv[1] not in ('best', 'save', 'restore'):
+        print(__doc__[__doc__.index('Usage'):].strip())
+        sys.exit(1)
+    command, arg = sys.argv[1:]
+
+    import catalog, habitica
+    session = habitica.session(log=log)
+    profile = session.profile('items.gear.owned,items.gear.equipped,stats')
+    gear = profile['items']['gear']
+    if command == 'save':
+        save(arg, gear['equipped'])
+        log.info(f"Saved current gear as '{arg}'.")
+        return
+
+    gear_catalog = catalog.load(session)
+    if command == 'best':
+        loadout = best_gear(gear['owned'], gear_catalog, arg, profile['stats']['class'])
+    else:
+        loadout = saved_loadouts().get(arg)
+        if loadout is None:
+            log.error(f"No such loadout: {arg}")
+            sys.exit(1)
+    calls = apply(session, gear['equipped'], loadout, gear_catalog)
+    log.info(f"Done with {calls} equip calls. :-)")
+
+if __name__ == "__main__":
+    main()
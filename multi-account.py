@@ -0,0 +1,126 @@
+"""
+A script for running one of the other scripts across several accounts at
+once, as listed in the configuration file (see habitica.accounts).
+
+Usage: python multi-account.py autofeed|autosmash|autocron|pet-report
+                               [--workers n] [--only name,...]
+
+Each account runs on its own thread, with its own session: its own
+connection pool and rate limit budget, so the accounts do not slow one
+another down, and the whole run takes about as long as the slowest
+account. Failures are collected rather than stopping the others; a summary
+of every account's outcome is logged at the end, and the exit code is
+nonzero if any account failed.
+"""
+
+import argparse, concurrent.futures, io, logging, sys, threading, time
+
+from collections import defaultdict, namedtuple
+
+import catalog
+import habitica
+
+from scripts import load_script
+
+log = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] [%(threadName)s] %(message)s')
+
+# Loaded after logging is configured, so that log lines name their account.
+autocron = load_script('autocron')
+autofeed = load_script('autofeed')
+autosmash = load_script('autosmash')
+pet_report = load_script('pet-report')
+
+# Most threads spend their time waiting on the network or the rate limiter.
+max_workers = 32
+
+# The outcome of running a job for one account.
+Outcome = namedtuple('Outcome', 'account result error elapsed output')
+
+def report(session):
+    """Run pet-report, returning its tables rather than printing them."""
+    out = io.StringIO()
+    pet_report.pet_report(session.profile(pet_report.profile_fields), catalog.load(session),
+        defaultdict(str), out)
+    return out.getvalue()
+
+jobs = {
+    'autofeed': lambda session: autofeed.autofeed(session, session.profile(autofeed.profile_fields)),
+    'autosmash': lambda session: autosmash.autosmash(session),
+    'autocron': lambda session: autocron.autocron(session),
+    'pet-report': report,
+}
+
+def account_name(account):
+    return account.get('name', 'default')
+
+def run_one(job, account):
+    """
+    Run a job for one account, in a session of its own.
+
+    :return: The account's Outcome; exceptions are caught and recorded.
+    """
+    threading.current_thread().name = account_name(account)
+    start = time.monotonic()
+    result = error = output = None
+    try:
+        session = habitica.session(log=log, account=account)
+        try:
+            result = jobs[job](session)
+        finally:
+            session.close()
+        if isinstance(result, str): result, output = None, result
+        if result is not None:
+            error = f"did not complete: {getattr(result, 'name', result)}"
+    except Exception as exc:
+        log.exception(f"{job} failed")
+        error = f"{type(exc).__name__}: {exc}"
+    return Outcome(account_name(account), result, error, time.monotonic() - start, output)
+
+def run_all(job, accounts, workers=None):
+    """
+    Run a job for each of the given accounts in parallel.
+
+    :param job: Name of the job; see jobs.
+    :param accounts: Per-account configuration, as from habitica.accounts().
+    :param workers: Maximum number of accounts to run at once.
+    :return: List of Outcomes, in the order of the accounts given.
+    """
+    workers = workers or min(len(accounts), max_workers)
+    with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(lambda account: run_one(job, account), accounts))
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a script across several accounts.")
+    parser.add_argument('job', choices=sorted(jobs))
+    parser.add_argument('--workers', type=int, help='accounts to run at once')
+    parser.add_argument('--only', help='comma-separated account names')
+    args = parser.parse_args()
+
+    accounts = habitica.accounts()
+    if args.only:
+        wanted = set(args.only.split(','))
+        unknown = wanted - {account_name(account) for account in accounts}
+        if unknown:
+            log.error(f"Unknown accounts: {', '.join(sorted(unknown))}")
+            sys.exit(1)
+        accounts = [account for account in accounts if account_name(account) in wanted]
+
+    start = time.monotonic()
+    outcomes = run_all(args.job, accounts, args.workers)
+    elapsed = time.monotonic() - start
+
+    for outcome in outcomes:
+        if outcome.output is not None:
+            print(f"\n## {outcome.account} ##")
+            print(outcome.output, end='')
+
+    log.info(f"Ran {args.job} for {len(outcomes)} accounts in {elapsed:.2f}s:")
+    for outcome in outcomes:
+        status = f"failed ({outcome.error})" if outcome.error else "ok"
+        log.info(f"* {outcome.account}: {status} in {outcome.elapsed:.2f}s")
+    if any(outcome.error for outcome in outcomes):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
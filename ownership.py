@@ -0,0 +1,166 @@
+"""
+The ownership module indexes a player's stable: which pets and mounts they
+have, of which species and kind (hatching potion), in a compact matrix.
+
+The matrix is built in a single pass over the profile's items, and stores
+pets and mounts as bitsets (plain Python integers), one per species and one
+per kind. Row and column totals are then a popcount each, and questions such
+as "do I have this mount?" or "which mounts am I missing?" are answered
+without rescanning the stable.
+"""
+
+
+class OwnershipMatrix:
+    """
+    Species x kind matrix of owned pets (with their hunger) and mounts.
+
+    A pet counts as owned while it has a positive feeding score; once it
+    has been raised into a mount, its score drops to -1 until it is hatched
+    again. A mount counts as owned when its flag is true.
+
+    Attributes:
+    * species: list of species, in index order
+    * kinds: list of kinds, in index order
+    * unknown_pets: pets whose kind is not in the catalog (and which are
+                    not special pets), in stable order
+    """
+
+    def __init__(self, species=(), kinds=()):
+        self.species = []
+        self.kinds = []
+        self._species_index = {}
+        self._kind_index = {}
+        self._pets_by_species = []
+        self._mounts_by_species = []
+        self._pets_by_kind = []
+        self._mounts_by_kind = []
+        self._hunger = {}
+        self.unknown_pets = []
+        for s in species: self._species(s)
+        for k in kinds: self._kind(k)
+
+    @classmethod
+    def from_items(cls, items, catalog=None):
+        """
+        Build the matrix in one pass over a profile's items.
+
+        :param items: The profile's items, with (at least) pets and mounts.
+        :param catalog: The content Catalog; if given, its species and kinds
+                        are included even when nothing of them is owned, and
+                        pets of unknown kinds are noted in unknown_pets.
+        :return: The OwnershipMatrix.
+        """
+        if catalog is None:
+            matrix = cls()
+        else:
+            matrix = cls(sorted(catalog.drop_eggs | catalog.quest_eggs),
+                sorted(catalog.potions))
+        known_kinds = None if catalog is None else catalog.potions
+        special_pets = set() if catalog is None else catalog.special_pets
+
+        for pet, hunger in items.get('pets', {}).items():
+            species, _, kind = pet.rpartition('-')
+            if known_kinds is not None and kind not in known_kinds and pet not in special_pets:
+                matrix.unknown_pets.append(pet)
+            if hunger is None or hunger <= 0: continue
+            i, j = matrix._species(species), matrix._kind(kind)
+            matrix._pets_by_species[i] |= 1 << j
+            matrix._pets_by_kind[j] |= 1 << i
+            matrix._hunger[i, j] = hunger
+
+        for mount, owned in items.get('mounts', {}).items():
+            if owned is not True: continue
+            species, _, kind = mount.rpartition('-')
+            i, j = matrix._species(species), matrix._kind(kind)
+            matrix._mounts_by_species[i] |= 1 << j
+            matrix._mounts_by_kind[j] |= 1 << i
+
+        return matrix
+
+    # -- Lookups --
+
+    def has_pet(self, species, kind):
+        i, j = self._species_index.get(species), self._kind_index.get(kind)
+        return i is not None and j is not None and bool(self._pets_by_species[i] >> j & 1)
+
+    def has_mount(self, species, kind):
+        i, j = self._species_index.get(species), self._kind_index.get(kind)
+        return i is not None and j is not None and bool(self._mounts_by_species[i] >> j & 1)
+
+    def hunger(self, species, kind):
+        """
+        :return: The pet's feeding score, or None if the pet is not owned.
+        """
+        return self._hunger.get((self._species_index.get(species), self._kind_index.get(kind)))
+
+    # -- Reductions --
+
+    def pet_count(self, species=None, kind=None):
+        """
+        :return: Number of pets owned of the given species (a row), of the
+                 given kind (a column), or both (0 or 1), or overall.
+        """
+        return self._count(self._pets_by_species, self._pets_by_kind, species, kind)
+
+    def mount_count(self, species=None, kind=None):
+        """
+        :return: Number of mounts owned; see pet_count.
+        """
+        return self._count(self._mounts_by_species, self._mounts_by_kind, species, kind)
+
+    def missing_mounts(self, species=None, kinds=None):
+        """
+        :param species: Species to consider, or None for all.
+        :param kinds: Kinds to consider, or None for all.
+        :return: List of mounts (e.g. 'Wolf-Base') not owned.
+        """
+        species = self.species if species is None else [species] if isinstance(species, str) else species
+        kinds = self.kinds if kinds is None else kinds
+        kind_mask = self._mask(self._kind_index, kinds)
+        missing = []
+        for s in species:
+            i = self._species_index.get(s)
+            row = 0 if i is None else self._mounts_by_species[i]
+            wanted = kind_mask & ~row
+            missing.extend(f'{s}-{k}' for k in kinds
+                if k in self._kind_index and wanted >> self._kind_index[k] & 1)
+        return missing
+
+    # -- Internals --
+
+    def _count(self, by_species, by_kind, species, kind):
+        if species is not None and kind is not None:
+            i, j = self._species_index.get(species), self._kind_index.get(kind)
+            return 0 if i is None or j is None else by_species[i] >> j & 1
+        if species is not None:
+            i = self._species_index.get(species)
+            return 0 if i is None else by_species[i].bit_count()
+        if kind is not None:
+            j = self._kind_index.get(kind)
+            return 0 if j is None else by_kind[j].bit_count()
+        return sum(row.bit_count() for row in by_species)
+
+    @staticmethod
+    def _mask(index, names):
+        mask = 0
+        for name in names:
+            if name in index: mask |= 1 << index[name]
+        return mask
+
+    def _species(self, species):
+        i = self._species_index.get(species)
+        if i is None:
+            i = self._species_index[species] = len(self.species)
+            self.species.append(species)
+            self._pets_by_species.append(0)
+            self._mounts_by_species.append(0)
+        return i
+
+    def _kind(self, kind):
+        j = self._kind_index.get(kind)
+        if j is None:
+            j = self._kind_index[kind] = len(self.kinds)
+            self.kinds.append(kind)
+            self._pets_by_kind.append(0)
+            self._mounts_by_kind.append(0)
+        return j
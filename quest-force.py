@@ -11,12 +11,19 @@ import habitica
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-session = habitica.session()
+def force_start(session):
+    party = session.party()
+    if party['quest']['active']:
+        log.info(f"Quest {party['quest']['key']} is already active.")
+    else:
+        log.info(f"Quest still not started... force starting!")
+        # Time critical: give up rather than block past the smash window.
+        result = session.force_start_quest(deadline=10)
+        log.info(result)
 
-party = session.party()
-if party['quest']['active']:
-    log.info(f"Quest {party['quest']['key']} is already active.")
-else:
-    log.info(f"Quest still not started... force starting!")
-    result = session.force_start_quest()
-    log.info(result)
+def main():
+    session = habitica.session()
+    force_start(session)
+
+if __name__ == "__main__":
+    main()
@@ -19,32 +19,49 @@ class ExitCodes(enum.Enum):
     QUEST_ALREADY_ACTIVE = enum.auto()
     INVITATION_ALREADY_PENDING = enum.auto()
 
-# Parse arguments.
-
-if len(sys.argv) < 2:
-    print("Usage: python quest-invite.py quest-id")
-    sys.exit(ExitCodes.INVALID_USAGE.value)
-
-quest_id = sys.argv[1]
-
-# Verify that we own the quest scroll.
-session = habitica.session()
-items = session.profile('items')['items']
-quests = items['quests']
-if not quest_id in quests or quests[quest_id] <= 0:
-    log.error(f"You do not have a {quest_id} quest!")
-    sys.exit(ExitCodes.QUEST_NOT_OWNED.value)
-
-# Verify that we aren't already doing a quest.
-party = session.party()
-if party['quest']['active']:
-    log.error(f"Quest already active: {party['quest']['key']}")
-    sys.exit(ExitCodes.QUEST_ALREADY_ACTIVE.value)
-if 'key' in party['quest'] and party['quest']['key']:
-    log.error(f"Quest invitation already pending: {party['quest']['key']}")
-    sys.exit(ExitCodes.INVITATION_ALREADY_PENDING.value)
-
-# Invite party to the quest.
-log.info(f"Inviting party to quest {quest_id}...")
-result = session.invite_quest(quest_id)
-log.info(result)
+def invite(session, quest_id):
+    """
+    Invite the party to the given quest, if possible.
+
+    :return: None on success, or the ExitCodes member describing the failure.
+    """
+    # Fetch inventory and party status concurrently.
+    async_session = habitica.AsyncHabiticaSession(session)
+    profile, party = habitica.run_concurrently(
+        async_session.profile('items.quests'),
+        async_session.party(),
+    )
+
+    # Verify that we own the quest scroll.
+    quests = profile['items']['quests']
+    if not quest_id in quests or quests[quest_id] <= 0:
+        log.error(f"You do not have a {quest_id} quest!")
+        return ExitCodes.QUEST_NOT_OWNED
+
+    # Verify that we aren't already doing a quest.
+    if party['quest']['active']:
+        log.error(f"Quest already active: {party['quest']['key']}")
+        return ExitCodes.QUEST_ALREADY_ACTIVE
+    if 'key' in party['quest'] and party['quest']['key']:
+        log.error(f"Quest invitation already pending: {party['quest']['key']}")
+        return ExitCodes.INVITATION_ALREADY_PENDING
+
+    # Invite party to the quest.
+    log.info(f"Inviting party to quest {quest_id}...")
+    result = session.invite_quest(quest_id)
+    log.info(result)
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python quest-invite.py quest-id")
+        sys.exit(ExitCodes.INVALID_USAGE.value)
+
+    quest_id = sys.argv[1]
+
+    session = habitica.session()
+    failure = invite(session, quest_id)
+    if failure is not None:
+        sys.exit(failure.value)
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,18 @@ Usage: python quest-list.py
 
 import habitica
 
-session = habitica.session()
-quests = session.profile('items')['items']['quests']
+def owned_quests(session):
+    """
+    :return: Dictionary of quest ID -> count, for quests you own at least one of.
+    """
+    quests = session.profile('items.quests')['items']['quests']
+    return {quest_id: count for quest_id, count in quests.items() if count > 0}
 
-print("Available quests:")
-for quest_id, count in quests.items():
-    if count > 0:
+def main():
+    session = habitica.session()
+    print("Available quests:")
+    for quest_id, count in owned_quests(session).items():
         print(f"* {count}x {quest_id}")
+
+if __name__ == "__main__":
+    main()
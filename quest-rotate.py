@@ -0,0 +1,226 @@
+"""
+A script to keep the party questing: it watches the party's quest, and
+invites the party to the next quest scroll as soon as the previous quest
+finishes.
+
+Usage: python quest-rotate.py [--prefer quest-id,...] [--exclude quest-id,...]
+                              [--once]
+
+Scrolls are picked from your inventory: the first of the preferred quests
+you own, or else a random one of those not excluded (by default, quests
+that take a long time or need special preparation). The inventory is
+fetched once, kept up to date locally as scrolls are used, and fetched
+again only after a quest finishes (it may have dropped more scrolls) or
+when nothing suitable is left.
+
+The party is checked often while its quest is changing, and less and less
+often while nothing happens. If webhooks are configured (see webhooks.py),
+a quest starting or finishing is noticed the moment it happens, and the
+party is otherwise only checked occasionally, in case an event went
+missing.
+
+With --once, the script invites the party to a quest if it has none, and
+exits.
+"""
+
+import argparse, logging, random, time
+
+import habitica
+import webhooks
+
+log = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
+default_exclusions = [
+    'dustbunnies', 'atom1', 'vice1', 'basilist', 'goldenknight1',
+    'moonstone1', 'vice2', 'stoikalmCalamity1', 'stoikalmCalamity2',
+    'mayhemMistiflying1', 'mayhemMistiflying2', 'dilatoryDistress1',
+    'dilatoryDistress2', 'taskwoodsTerror1', 'taskwoodsTerror2',
+    'lostMasterclasser1', 'lostMasterclasser4', 'cow', 'seaserpent',
+    'treeling',
+]
+
+# Seconds between checks of the party: the shortest, just after something
+# changed, and the longest, after a long time without change.
+default_min_interval = 60
+default_max_interval = 30 * 60
+
+# The longest wait when webhook events will announce changes anyway.
+default_max_interval_with_events = 6 * 60 * 60
+
+def choose_quest(owned, prefer=(), exclude=(), rng=random):
+    """
+    Pick the quest to invite the party to next.
+
+    :param owned: Dictionary of quest ID -> number of scrolls owned.
+    :param prefer: Quest IDs to pick first, in order of priority.
+    :param exclude: Quest IDs never to pick (unless preferred).
+    :return: A quest ID, or None if there is no suitable scroll.
+    """
+    for quest in prefer:
+        if owned.get(quest, 0) > 0:
+            return quest
+    exclude = set(exclude)
+    candidates = sorted(q for q, count in owned.items() if count > 0 and q not in exclude)
+    return rng.choice(candidates) if candidates else None
+
+class QuestRotation:
+    """
+    Keeps the party on a quest, inviting it to the next scroll whenever
+    it has none; see the module docstring.
+    """
+
+    def __init__(self, session, prefer=(), exclude=default_exclusions, events=None,
+                 min_interval=default_min_interval, max_interval=None, rng=random):
+        """
+        :param session: The HabiticaSession to use.
+        :param prefer: Quest IDs to pick first; see choose_quest.
+        :param exclude: Quest IDs never to pick; see choose_quest.
+        :param events: Optional queue of questActivity events, as from
+                       webhooks.connect(), to react to immediately.
+        :param min_interval: Shortest time between checks, in seconds.
+        :param max_interval: Longest time between checks, in seconds; a
+                             default depending on whether events are given
+                             if None.
+        """
+        self.session = session
+        self.prefer = tuple(prefer)
+        self.exclude = tuple(exclude)
+        self.events = events
+        self.min_interval = min_interval
+        if max_interval is None:
+            max_interval = default_max_interval if events is None else default_max_interval_with_events
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.rng = rng
+        self._owned = None # Quest ID -> scroll count; None to fetch again.
+        self._last = None # The last quest state seen; see _state.
+
+    def run(self):
+        """
+        Keep the party questing, forever. A failed check is logged and
+        tried again later, backing off while failures continue.
+        """
+        while True:
+            try:
+                delay = self.step()
+            except Exception:
+                self.interval = min(self.interval * 2, self.max_interval)
+                log.exception(f"Quest rotation failed; retrying in {self.interval}s")
+                delay = self.interval
+            self.wait(delay)
+
+    def step(self):
+        """
+        Check the party's quest once, inviting the party to the next one if
+        it has none.
+
+        :return: Seconds to wait before the next check.
+        """
+        if self.session.cache is not None:
+            self.session.cache.invalidate('party') # A cached party would hide changes.
+        quest = self.session.party()['quest']
+        state = self._state(quest)
+        if state != self._last:
+            if self._last is not None and self._last[0] and not state[0]:
+                log.info(f"Quest {self._last[0]} is over.")
+                self._forget_inventory() # It may have dropped more scrolls.
+            self._last = state
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+        if quest.get('key'):
+            status = 'active' if quest.get('active') else 'pending'
+            log.info(f"Quest {quest['key']} is {status}; checking again in {self.interval}s.")
+            return self.interval
+        if self.invite_next():
+            self.interval = self.min_interval # Look again soon, to see it accepted.
+        else:
+            self._forget_inventory() # Scrolls may be bought or gifted meanwhile.
+            self.interval = self.max_interval
+        return self.interval
+
+    def invite_next(self):
+        """
+        Invite the party to the next quest, if there is a suitable scroll.
+
+        :return: The quest ID invited to, or None.
+        """
+        owned = self.inventory()
+        quest = choose_quest(owned, self.prefer, self.exclude, self.rng)
+        if quest is None:
+            log.info("No suitable quests owned!")
+            return None
+        log.info(f"Inviting party to quest {quest}...")
+        try:
+            self.session.invite_quest(quest)
+        except RuntimeError as exc:
+            # Someone else invited the party first, or the scroll is gone.
+            log.warning(f"Could not invite party to {quest}: {exc}")
+            self._forget_inventory()
+            return None
+        owned[quest] -= 1
+        return quest
+
+    def inventory(self):
+        """
+        :return: Dictionary of quest ID -> scrolls owned, fetched only when
+                 the local copy may be out of date.
+        """
+        if self._owned is None:
+            quests = self.session.profile('items.quests')['items']['quests']
+            self._owned = {quest: count for quest, count in quests.items() if count > 0}
+        return self._owned
+
+    def _forget_inventory(self):
+        """
+        Fetch the inventory afresh next time, rather than from the local
+        copy or the session's response cache.
+        """
+        self._owned = None
+        if self.session.cache is not None:
+            self.session.cache.invalidate('user')
+
+    def wait(self, seconds):
+        """
+        Wait until the next check is due, or a quest event arrives.
+        """
+        if self.events is None:
+            time.sleep(seconds)
+            return
+        event = webhooks.next_event(self.events, seconds)
+        while event is not None:
+            log.info(f"Event: {webhooks.topic(event)} ({(event.get('quest') or {}).get('key')})")
+            if event.get('type') == 'questFinished':
+                self._forget_inventory() # It may have dropped more scrolls.
+            event = webhooks.next_event(self.events, 0) # Handle a burst at once.
+
+    @staticmethod
+    def _state(quest):
+        progress = quest.get('progress') or {}
+        return (quest.get('key'), bool(quest.get('active')), progress.get('hp'),
+            sum((progress.get('collect') or {}).values()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Invite the party to quests, one after another.")
+    parser.add_argument('--prefer', default='', help='comma-separated quest IDs, in priority order')
+    parser.add_argument('--exclude', default=','.join(default_exclusions),
+        help='comma-separated quest IDs never to pick')
+    parser.add_argument('--once', action='store_true', help='invite once, if possible, and exit')
+    args = parser.parse_args()
+    prefer = [q for q in args.prefer.split(',') if q]
+    exclude = [q for q in args.exclude.split(',') if q]
+
+    session = habitica.session(log=log)
+    if args.once:
+        QuestRotation(session, prefer, exclude).step()
+        return
+    with webhooks.connect(session, ['questActivity']) as events:
+        try:
+            QuestRotation(session, prefer, exclude, events).run()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
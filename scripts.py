@@ -0,0 +1,18 @@
+"""
+The scripts module loads the scripts in this directory as modules, so that
+others (e.g. autoloop.py) can call their logic in-process. Importing it has
+no side effects.
+"""
+import importlib.util, os
+
+
+def load_script(name):
+    """
+    Import one of the scripts alongside this one, e.g. 'quest-invite'.
+    Scripts with dashes in their names cannot be imported the usual way.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f'{name}.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
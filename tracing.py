@@ -0,0 +1,142 @@
+"""
+The tracing module records how long each phase of a script takes, as spans
+viewable in Chrome's about:tracing or https://ui.perfetto.dev.
+
+Tracing is off unless enabled, and then costs next to nothing. Enable it
+with the HABITICA_TRACE environment variable (set to the trace file to
+write), or by passing --trace (or --trace=file) to a script that calls
+tracing.setup(). The trace is written when the script exits, by default
+to trace.json.
+
+Spans marked as hot can also be profiled with cProfile, by setting
+HABITICA_PROFILE (to the stats file to write) or passing --profile
+(or --profile=file); view the result with e.g. `python -m pstats`.
+
+Example:
+    tracing.setup()
+    with tracing.span('plan'):
+        ...
+"""
+import atexit, contextlib, cProfile, json, os, sys, threading, time
+
+import habitica
+
+default_trace_file = 'trace.json'
+default_profile_file = 'profile.prof'
+
+trace_file = None
+profile_file = None
+
+_events = []
+_lock = threading.Lock()
+_profiler = None
+_origin = time.perf_counter()
+
+
+def setup(argv=None):
+    """
+    Enable tracing and profiling as requested by the environment, or by
+    --trace and --profile arguments, which are removed from argv.
+
+    :param argv: The argument list to inspect; defaults to sys.argv.
+    """
+    if argv is None: argv = sys.argv
+    trace = _pop_flag(argv, '--trace', default_trace_file) or os.environ.get('HABITICA_TRACE')
+    profile = _pop_flag(argv, '--profile', default_profile_file) or os.environ.get('HABITICA_PROFILE')
+    if trace: enable(trace)
+    if profile: enable_profiling(profile)
+
+
+def enable(path=default_trace_file):
+    """Start recording spans, to be written to the given file at exit."""
+    global trace_file
+    if trace_file is None: atexit.register(write)
+    trace_file = path
+
+
+def enable_profiling(path=default_profile_file):
+    """Profile hot spans, writing the stats to the given file at exit."""
+    global profile_file, _profiler
+    if profile_file is None: atexit.register(write_profile)
+    profile_file = path
+    _profiler = cProfile.Profile()
+
+
+@contextlib.contextmanager
+def span(name, hot=False, **args):
+    """
+    Record the enclosed code as a span.
+
+    :param name: The span's name, e.g. 'fetch'.
+    :param hot: Whether to profile the span, if profiling is enabled.
+    :param args: Extra details to show with the span.
+    """
+    profiling = hot and _profiler is not None
+    if trace_file is None and not profiling:
+        yield
+        return
+    if profiling: _profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        if profiling: _profiler.disable()
+        if trace_file is not None:
+            _record(name, start, end, args)
+
+
+def instrument(session):
+    """
+    Record each of a HabiticaSession's HTTP requests as a span too,
+    so that network time shows up alongside the script's phases.
+    """
+    observe = session._observe
+    def traced(method, url, send):
+        with span(habitica.endpoint_label(method, url), category='http'):
+            return observe(method, url, send)
+    session._observe = traced
+    return session
+
+
+def write(path=None):
+    """Write the spans recorded so far as a Chrome trace-event file."""
+    path = path or trace_file
+    if path is None: return
+    with _lock:
+        events = list(_events)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def write_profile(path=None):
+    """Write the profile of hot spans, in pstats format."""
+    path = path or profile_file
+    if path is None or _profiler is None: return
+    _profiler.dump_stats(path)
+
+
+def _record(name, start, end, args):
+    event = {
+        'name': name,
+        'cat': args.pop('category', 'phase'),
+        'ph': 'X',
+        'ts': (start - _origin) * 1e6,
+        'dur': (end - start) * 1e6,
+        'pid': os.getpid(),
+        'tid': threading.get_ident(),
+    }
+    if args: event['args'] = args
+    with _lock:
+        _events.append(event)
+
+
+def _pop_flag(argv, flag, default):
+    for i, arg in enumerate(argv):
+        if arg == flag:
+            del argv[i]
+            return default
+        if arg.startswith(f'{flag}='):
+            del argv[i]
+            return arg.split('=', 1)[1]
+    return None
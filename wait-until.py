@@ -1,17 +1,35 @@
 """
-Usage: python wait-until.py desired-time
+Usage: python wait-until.py desired-time [action [quest-id]]
 
-where `desired-time` is an `HH:MM` timestamp e.g. `23:45`.
+where `desired-time` is an `HH:MM` or `HH:MM:SS` timestamp e.g. `23:45`.
+
+If an action is given, it is performed precisely at the desired time:
+shortly beforehand, the script connects to Habitica and prepares the
+request, which then goes out within milliseconds of the target time.
+Available actions:
+
+* `force-start` - force-start the pending quest (unless already active)
+* `cron` - run cron
+* `invite quest-id` - invite the party to the given quest
 """
 
 import datetime, logging, enum, sys, time
 
+import habitica
+
 log = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
 class ExitCodes(enum.Enum):
     INVALID_USAGE = enum.auto()
     INVALID_TIMESTAMP = enum.auto()
+    INVALID_ACTION = enum.auto()
+
+# Seconds before the target time to connect and prepare the request.
+default_lead = 5
+
+# Seconds before the target time to stop sleeping and start spinning.
+spin_window = 0.002
 
 def current_timestamp():
     """
@@ -25,8 +43,10 @@ def current_timestamp():
 def parse_timestamp(ts):
     try:
         now = datetime.datetime.now()
-        hhmm = datetime.datetime.strptime(ts, '%H:%M')
-        then = datetime.datetime(year=now.year, month=now.month, day=now.day, hour=hhmm.hour, minute=hhmm.minute)
+        fmt = '%H:%M:%S' if ts.count(':') == 2 else '%H:%M'
+        hhmm = datetime.datetime.strptime(ts, fmt)
+        then = datetime.datetime(year=now.year, month=now.month, day=now.day,
+            hour=hhmm.hour, minute=hhmm.minute, second=hhmm.second)
         if now >= then: then += datetime.timedelta(days=1)
         return then
     except ValueError:
@@ -34,16 +54,99 @@ def parse_timestamp(ts):
         sys.exit(ExitCodes.INVALID_TIMESTAMP.value)
 
 def wait_until(then):
+    if datetime.datetime.now() < then:
+        log.info(f"Waiting {then - current_timestamp()} until {then}...")
     while True:
-        now = current_timestamp()
-        if now >= then: break # It is time!
-        delta = then - now
-        log.info(f"Waiting {delta} until {then}...")
-        time.sleep(delta.seconds)
-
-if len(sys.argv) < 2:
-    print("Usage: python wait-until.py desired-time")
-    sys.exit(ExitCodes.INVALID_USAGE.value)
-
-desired_time = parse_timestamp(sys.argv[1])
-wait_until(desired_time)
+        remaining = (then - datetime.datetime.now()).total_seconds()
+        if remaining <= 0: break # It is time!
+        # Sleep in bounded chunks, in case the wall clock jumps
+        # (e.g. the machine suspends, or NTP adjusts the time).
+        time.sleep(min(remaining, 60))
+
+def sleep_until(target):
+    """
+    Sleep until the given time.monotonic() value, as precisely as possible:
+    sleep until just before it, then spin for the last few milliseconds.
+    """
+    while True:
+        remaining = target - time.monotonic()
+        if remaining <= spin_window: break
+        time.sleep(min(remaining - spin_window, 60))
+    while time.monotonic() < target:
+        pass
+
+def prepare_action(session, action, args):
+    """
+    Check whether the action still needs doing, and if so, prepare it.
+
+    :return: A PreparedCall, or None if there is nothing to do.
+    """
+    if action == 'cron':
+        return session.prepare('cron', deadline=10)
+
+    # Prefetch the party, to avoid pointless quest requests.
+    quest = session.party()['quest']
+    if action == 'force-start':
+        if quest.get('active'):
+            log.info(f"Quest {quest['key']} is already active.")
+            return None
+        return session.prepare('force_start_quest', deadline=10)
+    if action == 'invite':
+        if quest.get('key'):
+            log.info(f"Quest {quest['key']} is already pending or active.")
+            return None
+        return session.prepare('invite_quest', args[0], deadline=10)
+    raise ValueError(f"Invalid action: {action}")
+
+def fire_at(session, then, action, args=(), lead=default_lead):
+    """
+    Perform an action precisely at the given time.
+
+    :param session: The HabiticaSession to use.
+    :param then: The datetime at which to send the request.
+    :param action: One of 'force-start', 'cron' or 'invite'.
+    :param args: Extra arguments for the action (the quest ID, for 'invite').
+    :param lead: Seconds beforehand to connect and prepare the request.
+    :return: The result of the request, or None if it was not needed.
+    """
+    wait_until(then - datetime.timedelta(seconds=lead))
+
+    log.info(f"Warming up for {action} at {then}...")
+    warmup = session.warm_up()
+    call = prepare_action(session, action, args)
+    if call is None: return None
+
+    # Switch to the monotonic clock for the final approach.
+    target = time.monotonic() + (then - datetime.datetime.now()).total_seconds()
+    log.info(f"Connected in {warmup * 1000:.0f} ms; " +
+        f"firing in {target - time.monotonic():.3f} s...")
+    sleep_until(target)
+    sent = time.monotonic()
+    result = call()
+    done = time.monotonic()
+    log.info(f"Sent {action} {(sent - target) * 1000:+.1f} ms from target; " +
+        f"response took {(done - sent) * 1000:.0f} ms")
+    return result
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python wait-until.py desired-time [action [quest-id]]")
+        sys.exit(ExitCodes.INVALID_USAGE.value)
+
+    desired_time = parse_timestamp(sys.argv[1])
+    if len(sys.argv) < 3:
+        wait_until(desired_time)
+        return
+
+    action, args = sys.argv[2], sys.argv[3:]
+    if action not in ('force-start', 'cron', 'invite') or \
+        (action == 'invite') != (len(args) == 1):
+        log.error(f"Invalid action '{' '.join(sys.argv[2:])}'")
+        sys.exit(ExitCodes.INVALID_ACTION.value)
+
+    session = habitica.session(log=log)
+    result = fire_at(session, desired_time, action, args)
+    if result is not None: log.info(result)
+
+if __name__ == "__main__":
+    main()
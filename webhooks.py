@@ -0,0 +1,315 @@
+"""
+The webhooks module receives Habitica's webhook events, so that scripts can
+react to quests starting and finishing, and tasks being scored, within
+moments, rather than polling the API to find out.
+
+Habitica POSTs a JSON event to a webhook's URL whenever something it is
+registered for happens. Here:
+
+* listen() runs a small HTTP server on a background thread, which publishes
+  each event it receives to an EventBus;
+* scripts subscribe() to the bus for the events they care about, e.g.
+  'questActivity.questFinished', and get a queue of them;
+* registered() registers webhooks pointing at the listener, and deletes
+  them again afterwards;
+* connect() does all of the above, as configured.
+
+Habitica has to be able to reach the listener, so its public URL (say, of a
+reverse proxy or tunnel in front of it) must be in the config file:
+
+    {"apiToken": "...", "webhooks": {"url": "https://example.org/habitica", "port": 8787}}
+
+Without one, connect() gives no events, and scripts carry on polling. A
+fakehabitica.py server on this machine delivers webhooks too, and is sent
+the listener's own address. Each listener only accepts events sent to a
+secret path, generated afresh each run and appended to the URL.
+
+Usage: python webhooks.py watch
+       python webhooks.py send listener-url event-type [quest-key]
+
+`watch` logs every event as it arrives. `send` posts a made-up event (e.g.
+questFinished) to a listener, for trying scripts out without Habitica.
+"""
+import argparse, contextlib, http.server, json, logging, queue, secrets, threading, urllib.parse, urllib.request
+
+import habitica
+
+log = logging.getLogger(__name__)
+
+default_label = 'habitica-tools'
+
+# The event types of each kind of webhook; see session.add_webhook.
+event_types = {
+    'questActivity': ('questStarted', 'questFinished', 'questInvited'),
+    'taskActivity': ('created', 'updated', 'deleted', 'scored', 'checklistScored'),
+    'userActivity': ('petHatched', 'mountRaised', 'leveledUp'),
+}
+
+loopback_hosts = ('127.0.0.1', 'localhost', '::1')
+
+
+def topic(event):
+    """
+    :return: The topic an event is published under, e.g.
+             'questActivity.questFinished'.
+    """
+    return f"{event.get('webhookType')}.{event.get('type')}"
+
+
+class EventBus:
+    """
+    Hands each published event to every subscriber interested in it, via
+    a queue per subscriber, so that events can be received on any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = [] # (topics, queue) pairs
+
+    def subscribe(self, *topics):
+        """
+        :param topics: Kinds of event to receive: webhook types (e.g.
+                       'questActivity') for all their events, or topics
+                       (e.g. 'questActivity.questFinished'). All events if
+                       none are given.
+        :return: A queue.Queue that will receive matching events.
+        """
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.append((frozenset(topics), events))
+        return events
+
+    def unsubscribe(self, events):
+        """Stop delivering events to a queue from subscribe()."""
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not events]
+
+    def publish(self, event):
+        """
+        Deliver an event to its subscribers.
+
+        :return: The number of subscribers it was delivered to.
+        """
+        name = topic(event)
+        kind = name.partition('.')[0]
+        with self._lock:
+            subscribers = [events for topics, events in self._subscribers
+                if not topics or name in topics or kind in topics]
+        for events in subscribers:
+            events.put(event)
+        return len(subscribers)
+
+
+bus = EventBus()
+
+
+def next_event(events, timeout=None):
+    """
+    Wait for the next event on a subscribed queue.
+
+    :param timeout: Maximum number of seconds to wait; forever if None.
+    :return: The event, or None if none arrived in time.
+    """
+    try:
+        return events.get(timeout=timeout)
+    except queue.Empty:
+        return None
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        path = urllib.parse.urlsplit(self.path).path
+        if path.rstrip('/').rpartition('/')[2] != self.server.secret:
+            return self._reply(404)
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return self._reply(400)
+        if not isinstance(event, dict):
+            return self._reply(400)
+        # Answer first: Habitica only waits so long, and counts failures.
+        self._reply(204)
+        log.debug(f"Received {topic(event)}")
+        self.server.bus.publish(event)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def listen(bus=bus, host='127.0.0.1', port=0, secret=None, verbose=False):
+    """
+    Start a webhook listener on a background thread.
+
+    :param bus: The EventBus to publish received events to.
+    :param port: Port to listen on; 0 picks a free one.
+    :param secret: The path segment events must be sent to; a random one
+                   if None.
+    :return: The server. Its URL is url(server); stop it with
+             server.shutdown().
+    """
+    server = http.server.ThreadingHTTPServer((host, port), Handler)
+    server.bus = bus
+    server.secret = secret or secrets.token_urlsafe(16)
+    server.verbose = verbose
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='webhooks', daemon=True).start()
+    return server
+
+
+def url(server, public_url=None):
+    """
+    The URL for Habitica to send events to.
+
+    :param public_url: Where the listener can be reached from outside, if
+                       not at its own address.
+    """
+    if public_url is None:
+        host, port = server.server_address[:2]
+        public_url = f'http://{host}:{port}'
+    return f"{public_url.rstrip('/')}/{server.secret}"
+
+
+def webhook_options(topics):
+    """
+    :return: Dictionary of webhook type -> options enabling the events of
+             the given topics (see EventBus.subscribe).
+    """
+    options = {}
+    for name in topics:
+        kind, _, event_type = name.partition('.')
+        if kind not in event_types:
+            raise ValueError(f'Unsupported webhook type: {kind}')
+        wanted = (event_type,) if event_type else event_types[kind]
+        options.setdefault(kind, dict.fromkeys(event_types[kind], False))
+        options[kind].update(dict.fromkeys(wanted, True))
+    return options
+
+
+@contextlib.contextmanager
+def registered(session, webhook_url, topics=('questActivity',), label=default_label):
+    """
+    Register webhooks sending the given topics' events to a URL, for the
+    duration of a with block.
+
+    Webhooks with the same label are deleted first: they can only be left
+    over from a run that was killed before it could clean up. So listeners
+    running at the same time for one account need different labels.
+
+    :return: The registered webhooks.
+    """
+    for webhook in session.webhooks():
+        if webhook.get('label') == label:
+            log.info(f"Deleting stale webhook {webhook['id']}")
+            session.delete_webhook(webhook['id'])
+    webhooks = []
+    try:
+        for webhook_type, options in webhook_options(topics).items():
+            webhooks.append(session.add_webhook(webhook_url, webhook_type, options, label))
+        yield webhooks
+    finally:
+        for webhook in webhooks:
+            try:
+                session.delete_webhook(webhook['id'])
+            except Exception as exc:
+                log.warning(f"Could not delete webhook {webhook['id']}: {exc}")
+
+
+@contextlib.contextmanager
+def connect(session, topics=('questActivity',), config=None, label=default_label):
+    """
+    Receive events for the session's account, if webhooks are configured
+    (see the module docstring), for the duration of a with block.
+
+    :param topics: Kinds of event to receive; see EventBus.subscribe.
+    :param config: The "webhooks" configuration; from the config file if None.
+    :return: A queue of the events, or None if webhooks are not available,
+             in which case the caller should poll instead.
+    """
+    if config is None: config = habitica.load_config().get('webhooks') or {}
+    local = urllib.parse.urlsplit(session.base_url).hostname in loopback_hosts
+    if not config.get('url') and not local:
+        yield None
+        return
+
+    host = config.get('host', '127.0.0.1' if local else '0.0.0.0')
+    server = listen(bus, host, config.get('port', 0))
+    events = bus.subscribe(*topics)
+    try:
+        webhook_url = url(server, config.get('url'))
+        with registered(session, webhook_url, topics, label):
+            log.info(f"Listening for {', '.join(topics)} events at {webhook_url}")
+            yield events
+    finally:
+        bus.unsubscribe(events)
+        server.shutdown()
+        server.server_close()
+
+
+def send(webhook_url, event, timeout=10):
+    """
+    Send an event to a webhook URL, as Habitica would; for trying out a
+    listener without Habitica.
+    """
+    request = urllib.request.Request(webhook_url, data=json.dumps(event).encode(),
+        headers={'Content-Type': 'application/json'}, method='POST')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status
+
+
+def fake_event(event_type, quest_key=None):
+    """
+    :return: A minimal event of the given type, e.g. 'questFinished'.
+    """
+    webhook_type = next((kind for kind, types in event_types.items() if event_type in types), None)
+    if webhook_type is None:
+        raise ValueError(f'Unknown event type: {event_type}')
+    event = {'type': event_type, 'webhookType': webhook_type, 'user': {'_id': 'fake'}}
+    if webhook_type == 'questActivity':
+        event['group'] = {'id': 'party', 'name': 'Party'}
+        event['quest'] = {'key': quest_key}
+    elif webhook_type == 'taskActivity':
+        event['task'] = {'id': 'fake', 'type': 'habit', 'text': 'Fake', 'value': 0}
+    return event
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    parser = argparse.ArgumentParser(description="Receive or send Habitica webhook events.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('watch', help='log events as they arrive')
+    sender = commands.add_parser('send', help='send a made-up event to a listener')
+    sender.add_argument('url')
+    sender.add_argument('event_type', metavar='event-type')
+    sender.add_argument('quest_key', nargs='?', metavar='quest-key')
+    args = parser.parse_args()
+
+    if args.command == 'send':
+        send(args.url, fake_event(args.event_type, args.quest_key))
+        return
+
+    session = habitica.session(log=log)
+    with connect(session, tuple(event_types)) as events:
+        if events is None:
+            # Not reachable by Habitica, but still by `send`.
+            server = listen()
+            events = bus.subscribe()
+            log.info(f"No webhook URL configured; listening at {url(server)} only")
+        try:
+            while True:
+                event = next_event(events)
+                log.info(f"{topic(event)}: {json.dumps(event)}")
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()